@@ -0,0 +1,284 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.permissions import SAFE_METHODS, AllowAny
+from rest_framework.response import Response
+
+from .readers import ValuesReader
+from .serializers import Fieldset, SparseFieldsetMixin
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudgetMixin:
+    """
+    Lets a viewset declare how many SQL queries each action may issue, e.g.
+    ``query_budget = {'list': 4, 'retrieve': 3}``.
+
+    Counting starts after authentication and permission checks, and is only
+    switched on when ``QUERY_BUDGET_ENFORCE`` is set (every apps.courses test
+    case does, through ``CoursesTestCase``), so
+    an N+1 regression fails the tests instead of silently adding latency.
+    """
+    query_budget = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+            self._query_counter = CaptureQueriesContext(connection)
+            self._query_counter.__enter__()
+
+    def get_query_budget(self):
+        return self.query_budget.get(self.action)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        counter = getattr(self, '_query_counter', None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
+            self._query_counter = None
+            budget = self.get_query_budget()
+            if budget is not None and len(counter) > budget:
+                queries = '\n'.join(query['sql'] for query in counter.captured_queries)
+                raise QueryBudgetExceeded(
+                    f"{type(self).__name__}.{self.action} ran {len(counter)} queries, "
+                    f"budget is {budget}:\n{queries}"
+                )
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for ``retrieve``.
+
+    Subclasses implement ``get_validators()`` returning ``(etag, last_modified)``
+    from something cheap (a version stamp, an ``updated_at`` column) so a
+    client that is up to date gets a 304 without the body being serialized.
+    ``last_modified`` is a POSIX timestamp; either value may be None.
+
+    With more than one renderer the body depends on ``Accept``, so the ETag
+    names the rendered format and responses carry ``Vary: Accept``.
+    """
+
+    def get_validators(self):
+        return None, None
+
+    def negotiates_format(self):
+        return len(self.renderer_classes) > 1
+
+    def check_conditional_get(self, request):
+        etag, last_modified = self.get_validators()
+        if etag and self.negotiates_format():
+            etag = f'{etag}-{request.accepted_renderer.format}'
+        self._validators = (quote_etag(etag) if etag else None, int(last_modified) if last_modified else None)
+        if not any(self._validators):
+            return None
+        return get_conditional_response(request, etag=self._validators[0], last_modified=self._validators[1])
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.check_conditional_get(request)
+        if not_modified is not None:
+            return not_modified
+        return super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        etag, last_modified = getattr(self, '_validators', (None, None))
+        if response.status_code in (200, 304):
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        if self.negotiates_format():
+            patch_vary_headers(response, ['Accept'])
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ValuesReadMixin:
+    """
+    Serves the actions in ``values_read_actions`` ('list' and/or 'retrieve')
+    through a ValuesReader of the action's serializer class: rows come from
+    ``.values()`` and no model instances are built. The output is the same as
+    the serializer's.
+
+    ``retrieve`` this way skips ``check_object_permissions`` (there is no
+    object), so only list it for views without object-level permissions.
+
+    GET requests may narrow a SparseFieldsetMixin serializer with ``?fields=``
+    and ``?expand=``; the reader then selects only those columns and reads
+    only the expanded relations. The action's query budget covers the
+    default shape, and each expanded level adds one query to it.
+    """
+    values_read_actions = ()
+
+    def get_requested_fieldset(self):
+        if self.request.method not in SAFE_METHODS:
+            return None
+        return Fieldset.parse(self.request.query_params.get('fields'), self.request.query_params.get('expand'))
+
+    def get_fieldset(self):
+        """The fieldset to read; views may widen the requested one with fields ``restrict`` needs."""
+        return self.get_requested_fieldset()
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None and issubclass(self.get_serializer_class(), SparseFieldsetMixin):
+            kwargs.setdefault('fieldset', fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_reader(self):
+        serializer_class = self.get_serializer_class()
+        fieldset = self.get_fieldset() if issubclass(serializer_class, SparseFieldsetMixin) else None
+        reader = ValuesReader.for_serializer(serializer_class, fieldset)
+        if fieldset is not None:
+            self._sparse_queries = reader.nested_queries
+        return reader
+
+    def get_query_budget(self):
+        budget = super().get_query_budget()
+        if budget is None:
+            return None
+        return budget + getattr(self, '_sparse_queries', 0)
+
+    def list(self, request, *args, **kwargs):
+        if 'list' not in self.values_read_actions:
+            return super().list(request, *args, **kwargs)
+        reader = self.get_values_reader()
+        # Cursor pagination reads its position from the ordering columns of each row.
+        ordering = [field.lstrip('-') for field in getattr(self.paginator, 'ordering', ())]
+        rows = reader.values(self.filter_queryset(self.get_queryset()), *ordering)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.present(reader.shape(page)))
+        return Response(self.present(reader.shape(list(rows))))
+
+    def get_object_values(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            data = self.get_values_reader().read(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}))
+        except (TypeError, ValueError):
+            raise Http404
+        if not data:
+            raise Http404
+        return data[0]
+
+    def restrict(self, items):
+        """
+        Per-request changes to read items, e.g. hiding what the user may not
+        see. ``get_object_values`` doesn't apply it, so its result can be
+        cached for every user.
+        """
+        return items
+
+    def present(self, items):
+        """``restrict`` applied to read items, without the fields the request didn't ask for."""
+        items = self.restrict(items)
+        requested = self.get_requested_fieldset()
+        if requested is not None and requested != self.get_fieldset():
+            items = [requested.select(item) for item in items]
+        return items
+
+    def retrieve(self, request, *args, **kwargs):
+        if 'retrieve' not in self.values_read_actions:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.present([self.get_object_values()])[0])
+
+
+# Paginator attributes naming the query parameters that pick a page and its size
+PAGINATION_QUERY_PARAMS = (
+    'page_query_param', 'page_size_query_param', 'cursor_query_param',
+    'limit_query_param', 'offset_query_param', 'count_query_param',
+)
+
+
+class SharedCacheMixin:
+    """
+    Read-only endpoints for anonymous visitors, cacheable by shared caches.
+
+    No authentication runs, so there is no session or token lookup and the
+    response can't depend on who is asking. 200 responses get
+    ``Cache-Control: public, max-age, s-maxage`` and a ``Surrogate-Key``
+    header from ``get_surrogate_keys()``, which the write side purges (see
+    ``apps.common.surrogate``). ``list``/``retrieve`` data is also kept in the
+    server-side cache under ``get_cache_version()``. Bump that version
+    wherever the surrogate keys are purged. The cache key covers the
+    parameters the paginator and the filter backends read, plus any extra
+    ``cache_query_params``; other parameters can't change the response.
+    """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+    http_method_names = ['get', 'head', 'options']
+    cache_query_params = ()
+
+    def get_surrogate_keys(self):
+        return ()
+
+    def get_cache_version(self):
+        """Version the cached data is stored under, or None to not cache it."""
+        return None
+
+    def get_cache_query_params(self):
+        names = set(self.cache_query_params)
+        if self.paginator is not None:
+            names.update(
+                getattr(self.paginator, name) for name in PAGINATION_QUERY_PARAMS
+                if getattr(self.paginator, name, None)
+            )
+        for backend_class in self.filter_backends:
+            backend = backend_class()
+            if hasattr(backend, 'get_filterset_class'):
+                filterset_class = backend.get_filterset_class(self, self.get_queryset())
+                if filterset_class is not None:
+                    names.update(filterset_class.base_filters)
+            elif isinstance(backend, SearchFilter) and getattr(self, 'search_fields', None):
+                names.add(backend.search_param)
+            elif isinstance(backend, OrderingFilter):
+                names.add(backend.ordering_param)
+        return names
+
+    def cached_data(self, build):
+        version = self.get_cache_version()
+        if version is None:
+            return build()
+        params = urlencode(sorted(
+            (name, value) for name in self.get_cache_query_params()
+            for value in self.request.query_params.getlist(name)
+        ))
+        # Paginated data holds absolute links, so the host is part of the key.
+        url = f'{self.request.get_host()}{self.request.path}?{params}'
+        key = f'shared:{hashlib.md5(url.encode()).hexdigest()}:{version}'
+        data = cache.get(key)
+        if data is None:
+            data = build()
+            cache.set(key, data, settings.PUBLIC_CACHE_S_MAXAGE)
+        return data
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return Response(self.cached_data(lambda: build(request, *args, **kwargs).data))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return Response(self.cached_data(lambda: build(request, *args, **kwargs).data))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == 200:
+            patch_cache_control(
+                response, public=True, max_age=settings.PUBLIC_CACHE_MAX_AGE,
+                s_maxage=settings.PUBLIC_CACHE_S_MAXAGE,
+            )
+            # JSON or MessagePack, depending on Accept
+            patch_vary_headers(response, ['Accept'])
+            keys = self.get_surrogate_keys()
+            if keys:
+                response['Surrogate-Key'] = ' '.join(keys)
+        return response
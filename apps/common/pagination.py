@@ -0,0 +1,80 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over ``(created_at, id)``: no COUNT(*), constant cost at any depth."""
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class EnrolledAtCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-enrolled_at', '-id')
+
+
+class OptionalCountLimitOffsetPagination(LimitOffsetPagination):
+    """
+    LimitOffsetPagination that drops the COUNT(*) when called with
+    ``?count=false``; ``next`` is then decided by fetching one extra row.
+    """
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param, '').lower() not in ('0', 'false', 'no'):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_more = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_more:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        if self.count is not None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that takes PostgreSQL's row estimate (pg_class.reltuples)
+    instead of COUNT(*) for unfiltered changelists of large tables. Filtered
+    lists, small tables and other databases still count exactly.
+    """
+    estimate_above = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_above:
+                return row[0]
+        return super().count
@@ -0,0 +1,115 @@
+"""
+Plain-dict read path for ModelSerializers.
+
+``ValuesReader(SerializerClass)`` inspects the serializer's fields once and
+compiles them into a plan of (output name, ``.values()`` column, converter).
+Reading then fetches rows with ``.values()`` and builds each output dict
+straight from the row: no model instances, no per-field ``get_attribute`` /
+``to_representation`` dispatch. Nested ``many=True`` serializers of reverse
+foreign keys are read with one extra query per level, like a prefetch.
+
+A reader follows the serializer instance it is built from, so one narrowed
+with a Fieldset (see ``apps.common.serializers``) only selects the columns
+and reads the relations the fieldset asks for.
+
+Only fields whose output can be reproduced exactly are accepted; anything
+else (method fields, hyperlinks, single nested serializers) raises
+ImproperlyConfigured when the reader is built, so a serializer change can't
+silently make the two paths disagree.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import ManyToOneRel
+from rest_framework import serializers
+
+# Fields whose to_representation returns database values unchanged.
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField, serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+# Fields whose output depends on more than the column value (the object, the request...).
+UNSUPPORTED_FIELDS = (
+    serializers.BaseSerializer, serializers.SerializerMethodField, serializers.RelatedField,
+    serializers.ManyRelatedField, serializers.FileField,
+)
+
+
+class ValuesReader:
+    def __init__(self, serializer):
+        self.model = serializer.Meta.model
+        self.plan = []  # (name, column, converter or None)
+        self.nested = []  # (name, foreign key column on the child, child reader)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.nested.append(self._nested(name, field))
+                self.plan.append((name, None, None))
+            else:
+                self.plan.append((name, self._column(name, field), self._converter(name, field)))
+        self.columns = list(dict.fromkeys(column for _, column, _ in self.plan if column))
+        if 'pk' not in self.columns and self.nested:
+            self.columns.append('pk')
+        # Queries a read issues on top of the one for the top-level rows.
+        self.nested_queries = sum(1 + reader.nested_queries for _, _, reader in self.nested)
+
+    @classmethod
+    @lru_cache(maxsize=256)
+    def for_serializer(cls, serializer_class, fieldset=None):
+        """Shared reader for ``serializer_class``, narrowed to ``fieldset`` when one is given."""
+        if fieldset is None:
+            return cls(serializer_class())
+        return cls(serializer_class(fieldset=fieldset))
+
+    def _column(self, name, field):
+        if field.source == '*':
+            raise ImproperlyConfigured(f"{self.model.__name__}.{name}: source='*' is not supported")
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            return self.model._meta.get_field(field.source).attname
+        return field.source.replace('.', '__')
+
+    def _converter(self, name, field):
+        if isinstance(field, (*PASSTHROUGH_FIELDS, serializers.PrimaryKeyRelatedField)):
+            return None
+        if isinstance(field, UNSUPPORTED_FIELDS):
+            raise ImproperlyConfigured(f"{self.model.__name__}.{name}: {type(field).__name__} is not supported")
+        # Dates, decimals, floats...: exactly what the field itself would output.
+        return field.to_representation
+
+    def _nested(self, name, field):
+        relation = self.model._meta.get_field(field.source)
+        if not isinstance(relation, ManyToOneRel):
+            raise ImproperlyConfigured(f"{self.model.__name__}.{name}: only reverse foreign keys can be nested")
+        return name, relation.field.attname, ValuesReader(field.child)
+
+    def values(self, queryset, *extra):
+        """The ``.values()`` queryset to paginate; pass its rows to ``shape``."""
+        return queryset.prefetch_related(None).values(*dict.fromkeys([*self.columns, *extra]))
+
+    def shape(self, rows):
+        output = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.plan:
+                if column is None:
+                    item[name] = []
+                    continue
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            output.append(item)
+        for name, foreign_key, reader in self.nested:
+            parents = defaultdict(list)
+            for row, item in zip(rows, output):
+                parents[row['pk']].append(item[name])
+            children = reader.model._default_manager.filter(**{f'{foreign_key}__in': list(parents)})
+            child_rows = list(reader.values(children, foreign_key))
+            for child_row, child in zip(child_rows, reader.shape(child_rows)):
+                for siblings in parents[child_row[foreign_key]]:
+                    siblings.append(child)
+        return output
+
+    def read(self, queryset):
+        return self.shape(list(self.values(queryset)))
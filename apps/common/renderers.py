@@ -0,0 +1,66 @@
+"""
+Faster renderers and parsers for the API.
+
+``ORJSONRenderer``/``ORJSONParser`` produce and read the same JSON as DRF's
+stock classes, using orjson instead of the standard library encoder.
+``MessagePackRenderer``/``MessagePackParser`` speak ``application/msgpack``
+for clients that ask for it in ``Accept``/``Content-Type``. They are turned on
+with the API_FAST_RENDERERS setting.
+"""
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Datetimes (which DRF trims to milliseconds and writes with "Z") and whatever
+# orjson/msgpack can't encode natively (lazy strings, Decimal, UUID, timedelta,
+# querysets...) are converted the way DRF's JSONEncoder does it.
+_encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if (renderer_context or {}).get('indent') or 'indent=' in (accepted_media_type or ''):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_encode_default, option=option)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,110 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?expand=``.
+
+``fields=id,title,chapters.title`` keeps only the listed fields; a dotted
+name reaches into a nested serializer and expands it. ``expand=chapters.lessons``
+includes nested serializers, which are left out of a sparse response unless
+asked for. Without either parameter a serializer is unchanged.
+"""
+from typing import NamedTuple
+
+from rest_framework import serializers
+
+
+def _paths(value):
+    return [path.strip() for path in (value or '').split(',') if path.strip()]
+
+
+def _node():
+    return {'fields': None, 'expand': {}}
+
+
+class Fieldset(NamedTuple):
+    fields: frozenset = None  # None: every field that is not a nested serializer
+    expand: tuple = ()  # ((name, Fieldset), ...) sorted by name
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        """The fieldset for the two query parameters, or None when both are empty."""
+        fields, expand = _paths(fields), _paths(expand)
+        if not fields and not expand:
+            return None
+        root = _node()
+        for path in fields:
+            node = root
+            *parents, last = path.split('.')
+            for name in parents:
+                node['fields'] = (node['fields'] or set()) | {name}
+                node = node['expand'].setdefault(name, _node())
+            node['fields'] = (node['fields'] or set()) | {last}
+        for path in expand:
+            node = root
+            for name in path.split('.'):
+                node = node['expand'].setdefault(name, _node())
+        return cls._freeze(root)
+
+    def including(self, path):
+        """This fieldset plus the dotted ``path``, wherever the level it belongs to is in the output."""
+        name, _, rest = path.partition('.')
+        if not rest:
+            if self.fields is None or name in self.fields:
+                return self
+            return self._replace(fields=self.fields | {name})
+        expand = dict(self.expand)
+        if name not in expand:
+            # Not expanded: either left out, or included with all of its plain fields.
+            return self
+        expand[name] = expand[name].including(rest)
+        return self._replace(expand=tuple(sorted(expand.items())))
+
+    def select(self, item):
+        """A serialized ``item`` reduced to the fields this fieldset shows."""
+        expand = dict(self.expand)
+        selected = {}
+        for name, value in item.items():
+            if name in expand and isinstance(value, list):
+                selected[name] = [expand[name].select(child) for child in value]
+            elif name in expand and isinstance(value, dict):
+                selected[name] = expand[name].select(value)
+            elif name in expand or self.fields is None or name in self.fields:
+                selected[name] = value
+        return selected
+
+    @classmethod
+    def _freeze(cls, node):
+        return cls(
+            frozenset(node['fields']) if node['fields'] is not None else None,
+            tuple(sorted((name, cls._freeze(child)) for name, child in node['expand'].items())),
+        )
+
+
+class SparseFieldsetMixin:
+    """
+    ModelSerializer mixin taking a ``fieldset`` keyword argument. Nested
+    serializers it keeps are narrowed with their part of the fieldset, so
+    they need the mixin as well.
+    """
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fieldset is not None:
+            self.narrow(fieldset)
+
+    def narrow(self, fieldset, prefix=''):
+        fields = self.fields
+        expanded = dict(fieldset.expand)
+        for name in sorted(fieldset.fields or ()):
+            if name not in fields:
+                raise serializers.ValidationError({'fields': [f"Unknown field '{prefix}{name}'."]})
+        for name in expanded:
+            if not isinstance(fields.get(name), serializers.BaseSerializer):
+                raise serializers.ValidationError({'expand': [f"'{prefix}{name}' can't be expanded."]})
+        for name, field in list(fields.items()):
+            if isinstance(field, serializers.BaseSerializer):
+                if name in expanded or name in (fieldset.fields or ()):
+                    child = getattr(field, 'child', field)
+                    child.narrow(expanded.get(name, Fieldset()), f'{prefix}{name}.')
+                else:
+                    fields.pop(name)
+            elif fieldset.fields is not None and name not in fieldset.fields:
+                fields.pop(name)
@@ -0,0 +1,114 @@
+"""
+Surrogate-key purges for the CDN / reverse proxy in front of public pages.
+
+Public responses carry a ``Surrogate-Key`` header (see SharedCacheMixin);
+``purge(keys)`` asks the proxy to drop every cached page tagged with one of
+them. Keys are collected and handed over once after the transaction
+commits, so a bulk import that touches the same course a thousand times
+purges it once.
+
+The HTTP requests are sent by a background thread, never by the request
+that made the change. Keys queued while a purge is in flight are merged
+into the next one, so a burst of edits costs a few purges rather than one
+per write. Queued purges are still sent when the process exits; ``wait()``
+blocks until the queue is empty.
+
+The request is a Fastly-style batch purge: ``POST SURROGATE_PURGE_URL`` with
+the keys in a ``Surrogate-Key`` header and ``SURROGATE_PURGE_TOKEN`` as
+``Fastly-Key``. Without SURROGATE_PURGE_URL nothing is sent and pages simply
+expire after their s-maxage.
+"""
+import atexit
+import logging
+import queue
+import threading
+from collections import defaultdict
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+PURGE_TIMEOUT = 2
+# Most CDNs cap the number of keys in one purge request.
+BATCH_SIZE = 256
+
+_pending = threading.local()
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _pending_keys():
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    return _pending.keys
+
+
+def purge(keys):
+    _pending_keys().update(keys)
+    # Every purge schedules a flush, but the first one to run after commit
+    # queues all pending keys and the rest find nothing left. Keys from a
+    # rolled-back transaction go out with the next flush: an extra purge is harmless.
+    transaction.on_commit(flush)
+
+
+def flush():
+    pending = _pending_keys()
+    keys = set(pending)
+    pending.clear()
+    url = getattr(settings, 'SURROGATE_PURGE_URL', '')
+    if not keys or not url:
+        return
+    _start_worker()
+    _queue.put((url, getattr(settings, 'SURROGATE_PURGE_TOKEN', ''), keys))
+
+
+def wait():
+    """Block until every queued purge has been sent."""
+    _queue.join()
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        # A forked worker process inherits the Thread object but not the thread.
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='surrogate-purge', daemon=True)
+            _worker.start()
+
+
+def _work():
+    while True:
+        jobs = [_queue.get()]
+        while True:
+            try:
+                jobs.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        merged = defaultdict(set)
+        for url, token, keys in jobs:
+            merged[url, token] |= keys
+        try:
+            for (url, token), keys in merged.items():
+                _send(url, token, sorted(keys))
+        finally:
+            for _ in jobs:
+                _queue.task_done()
+
+
+def _send(url, token, keys):
+    for start in range(0, len(keys), BATCH_SIZE):
+        headers = {'Surrogate-Key': ' '.join(keys[start:start + BATCH_SIZE])}
+        if token:
+            headers['Fastly-Key'] = token
+        try:
+            urlopen(Request(url, method='POST', headers=headers), timeout=PURGE_TIMEOUT).close()
+        except OSError as exc:
+            # The pages still expire after their s-maxage; a failed purge must not fail the write.
+            logger.warning('Surrogate-key purge failed: %s', exc)
+
+
+# Daemon threads are stopped at exit; send what is queued first (management commands).
+atexit.register(wait)
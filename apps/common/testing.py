@@ -0,0 +1,86 @@
+"""
+Query-plan checks for tests.
+
+``assertNoSeqScans`` captures the queries run inside the block, EXPLAINs
+every SELECT and fails if one of them reads a whole large table instead of
+going through an index. On PostgreSQL sequential scans are disabled while
+explaining, so a "Seq Scan" in the plan means no usable index exists rather
+than that the planner preferred one for a tiny test table. On SQLite a plain
+"SCAN <table>" (without "USING INDEX") is the sequential scan.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN) "(\w+)"(?: (?:AS )?"?(\w+)"?)?')
+
+
+def _sqlite_scans(sql):
+    # SQLite names an aliased table by its alias ("SCAN U0"), so map aliases back.
+    tables = {alias: table for table, alias in TABLE_ALIAS.findall(sql) if alias}
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        details = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for match in filter(None, map(SQLITE_SCAN.match, details)):
+        name = match.group(2) or match.group(1)
+        scans.append(tables.get(name, name))
+    return scans
+
+
+def _postgresql_scans(sql):
+    def walk(node):
+        if node.get('Node Type') == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from walk(child)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        try:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('SET LOCAL enable_seqscan = on')
+    return list(walk(plan[0]['Plan']))
+
+
+def sequential_scans(sql):
+    """Tables that ``sql`` reads with a sequential scan."""
+    if connection.vendor == 'postgresql':
+        return _postgresql_scans(sql)
+    if connection.vendor == 'sqlite':
+        return _sqlite_scans(sql)
+    return []
+
+
+class QueryPlanMixin:
+    """TestCase mixin; ``large_tables`` are the tables that must never be scanned."""
+    large_tables = ()
+
+    def assertNoSeqScans(self, tables=None):
+        return _NoSeqScans(self, set(tables or self.large_tables))
+
+
+class _NoSeqScans(CaptureQueriesContext):
+    def __init__(self, test_case, tables):
+        super().__init__(connection)
+        self.test_case = test_case
+        self.tables = tables
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        problems = []
+        for query in self.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scanned = sorted(set(sequential_scans(sql)) & self.tables)
+            if scanned:
+                problems.append(f"{', '.join(scanned)}: {sql}")
+        if problems:
+            self.test_case.fail("Sequential scan on a large table:\n" + '\n'.join(problems))
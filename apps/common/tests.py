@@ -1,3 +1,70 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
 
-# Create your tests here.
+import msgpack
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from .renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer
+from .serializers import Fieldset
+
+
+class RendererTests(SimpleTestCase):
+    data = ReturnDict({
+        'title': "O‘zbek tili — kurs",
+        'price': Decimal('10.50'),
+        'created_at': datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'errors': [ErrorDetail('Required.', code='required'), gettext_lazy('Not found.')],
+        'nested': [{'id': 1, 'ok': True, 'score': None}],
+    }, serializer=None)
+
+    def test_orjson_matches_drf_json(self):
+        self.assertEqual(ORJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_json_round_trip_and_errors(self):
+        body = ORJSONRenderer().render({'a': [1, 2]})
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), {'a': [1, 2]})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"a": '))
+
+    def test_msgpack_round_trip(self):
+        body = MessagePackRenderer().render(self.data)
+        parsed = MessagePackParser().parse(io.BytesIO(body))
+        self.assertEqual(parsed, ORJSONParser().parse(io.BytesIO(ORJSONRenderer().render(self.data))))
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(msgpack.packb({'a': 1})[:-1]))
+
+    def test_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+
+class FieldsetTests(SimpleTestCase):
+    def test_no_parameters_means_no_fieldset(self):
+        self.assertIsNone(Fieldset.parse(None, None))
+        self.assertIsNone(Fieldset.parse('', ' , '))
+
+    def test_dotted_fields_expand_their_parents(self):
+        fieldset = Fieldset.parse('id, title,chapters.lessons.title', 'chapters')
+        self.assertEqual(fieldset.fields, {'id', 'title', 'chapters'})
+        chapters = dict(fieldset.expand)['chapters']
+        self.assertEqual(chapters.fields, {'lessons'})
+        self.assertEqual(dict(chapters.expand)['lessons'], Fieldset(frozenset({'title'})))
+
+    def test_expand_alone_keeps_every_field(self):
+        fieldset = Fieldset.parse(expand='chapters.lessons')
+        self.assertIsNone(fieldset.fields)
+        self.assertEqual(fieldset, Fieldset(None, (('chapters', Fieldset(None, (('lessons', Fieldset()),))),)))
+        self.assertEqual(hash(fieldset), hash(Fieldset.parse(expand='chapters.lessons,chapters')))
+
+    def test_including_adds_fields_only_where_the_level_is_shown(self):
+        fieldset = Fieldset.parse('id,chapters.lessons.title')
+        widened = fieldset.including('course').including('chapters.lessons.is_free_preview')
+        self.assertEqual(widened.fields, {'id', 'chapters', 'course'})
+        lessons = dict(dict(widened.expand)['chapters'].expand)['lessons']
+        self.assertEqual(lessons.fields, {'title', 'is_free_preview'})
+        self.assertEqual(Fieldset.parse('id').including('chapters.lessons.is_free_preview'), Fieldset.parse('id'))
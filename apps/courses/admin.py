@@ -1,27 +1,46 @@
 from django.contrib import admin
+
+from apps.common.pagination import EstimatedCountPaginator
 from .models import Course, Chapter, Lesson, Enrollment
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('title', 'level', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
     search_fields = ('title',)
     list_filter = ('level', 'created_at')
     ordering = ('-created_at',)
+    autocomplete_fields = ('created_by',)
+    readonly_fields = Course.COUNTER_FIELDS
 
 @admin.register(Chapter)
 class ChapterAdmin(admin.ModelAdmin):
     list_display = ('title', 'course')
+    # Chapter.__str__ reads course.title
+    list_select_related = ('course',)
     search_fields = ('title', 'course__title')
     ordering = ('course',)
+    autocomplete_fields = ('course',)
 
 @admin.register(Lesson)
 class LessonAdmin(admin.ModelAdmin):
     list_display = ('title', 'chapter', 'is_free_preview')
+    # The chapter column is str(chapter), which reads chapter.course.title
+    list_select_related = ('chapter__course',)
     search_fields = ('title', 'chapter__title')
     list_filter = ('is_free_preview',)
+    autocomplete_fields = ('chapter',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('user', 'course', 'enrolled_at')
+    list_select_related = ('user', 'course')
     search_fields = ('user__username', 'course__title')
     list_filter = ('enrolled_at',)
+    ordering = ('-enrolled_at', '-id')
+    raw_id_fields = ('user', 'course')
+    readonly_fields = ('completed_lessons',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
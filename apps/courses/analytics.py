@@ -0,0 +1,104 @@
+"""
+Enrollment analytics from rollups.
+
+EnrollmentRollup keeps one counter per (course, day) and (course, week), so a
+dashboard reads a few dozen rows instead of grouping the Enrollment table.
+Every enrollment write path goes through ``enrollments_changed``, which calls
+``record``; ``backfill`` rebuilds the counters from Enrollment.
+
+Buckets are calendar dates in settings.TIME_ZONE (Asia/Tashkent), not UTC, so
+an enrollment at 01:00 local time counts on that local day; weeks start on
+Monday.
+"""
+from collections import Counter
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F
+from django.db.models.functions import TruncDate, TruncWeek
+
+from .models import Enrollment, EnrollmentRollup
+
+DEFAULT_BUCKETS = {EnrollmentRollup.DAY: 30, EnrollmentRollup.WEEK: 12}
+
+
+def local_zone():
+    return ZoneInfo(settings.TIME_ZONE)
+
+
+def bucket_start(day, period):
+    return day if period == EnrollmentRollup.DAY else day - timedelta(days=day.weekday())
+
+
+def bucket(moment, period):
+    return bucket_start(moment.astimezone(local_zone()).date(), period)
+
+
+def _add(counts):
+    """Add ``counts`` ({(course_id, period, bucket): n}) to the rollups, creating rows as needed."""
+    adapt = connection.ops.adapt_datefield_value
+    added = [(course_id, period, adapt(day), n) for (course_id, period, day), n in counts.items() if n > 0]
+    if added:
+        table = connection.ops.quote_name(EnrollmentRollup._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {table} (course_id, period, bucket, count) VALUES (%s, %s, %s, %s) "
+                f"ON CONFLICT (course_id, period, bucket) DO UPDATE SET count = {table}.count + EXCLUDED.count",
+                added,
+            )
+    # Removals only touch existing rows: an unenrollment may be part of deleting the course itself.
+    for (course_id, period, day), n in counts.items():
+        if n < 0:
+            EnrollmentRollup.objects.filter(course_id=course_id, period=period, bucket=day).update(count=F('count') + n)
+
+
+def record(deltas, enrolled_at):
+    """Count ``deltas`` ({course_id: enrollments added or removed}) at ``enrolled_at``."""
+    counts = Counter()
+    for course_id, delta in deltas.items():
+        for period, _ in EnrollmentRollup.PERIODS:
+            counts[course_id, period, bucket(enrolled_at, period)] += delta
+    _add(counts)
+
+
+def backfill(course_ids=None):
+    """Rebuild the rollups (of ``course_ids``, or of every course) from Enrollment."""
+    enrollments = Enrollment.objects.order_by()
+    rollups = EnrollmentRollup.objects.all()
+    if course_ids is not None:
+        enrollments = enrollments.filter(course_id__in=course_ids)
+        rollups = rollups.filter(course_id__in=course_ids)
+    zone = local_zone()
+    truncations = {
+        EnrollmentRollup.DAY: TruncDate('enrolled_at', tzinfo=zone),
+        EnrollmentRollup.WEEK: TruncWeek('enrolled_at', tzinfo=zone, output_field=DateField()),
+    }
+    with transaction.atomic():
+        rollups.delete()
+        for period, truncation in truncations.items():
+            grouped = enrollments.annotate(bucket=truncation).values('course_id', 'bucket').annotate(n=Count('pk'))
+            EnrollmentRollup.objects.bulk_create(
+                [
+                    EnrollmentRollup(course_id=row['course_id'], period=period, bucket=row['bucket'], count=row['n'])
+                    for row in grouped
+                ],
+                batch_size=1000,
+            )
+
+
+def series(course_id, period, start, end):
+    """[{'bucket', 'enrollments'}] for every bucket from ``start`` to ``end``, zeros included."""
+    start, end = bucket_start(start, period), bucket_start(end, period)
+    counts = dict(
+        EnrollmentRollup.objects.filter(course_id=course_id, period=period, bucket__range=(start, end))
+        .values_list('bucket', 'count')
+    )
+    step = timedelta(days=1 if period == EnrollmentRollup.DAY else 7)
+    points, day = [], start
+    while day <= end:
+        points.append({'bucket': day, 'enrollments': counts.get(day, 0)})
+        day += step
+    return points
+
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.courses'
+
+    def ready(self):
+        from . import signals  # noqa
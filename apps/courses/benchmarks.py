@@ -0,0 +1,32 @@
+"""Throwaway data for the benchmark management commands."""
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Chapter, Course, Lesson
+
+LESSONS_PER_CHAPTER = 25
+
+
+@contextmanager
+def throwaway_course(lessons):
+    """A course with ``lessons`` lessons that only exists inside the ``with`` block."""
+    with transaction.atomic():
+        user = get_user_model().objects.create(username='benchmark', email='benchmark@example.com')
+        course = Course.objects.create(
+            title='Benchmark', description='Benchmark course', level='beginner', created_by=user
+        )
+        chapters = Chapter.objects.bulk_create([
+            Chapter(course=course, title=f'Chapter {index}', order=index)
+            for index in range(-(-lessons // LESSONS_PER_CHAPTER))
+        ])
+        Lesson.objects.bulk_create([
+            Lesson(
+                chapter=chapters[index // LESSONS_PER_CHAPTER], title=f'Lesson {index}', order=index,
+                content='Matn ' * 40, video_url=f'https://videos.example.com/{index}' if index % 2 else None,
+            )
+            for index in range(lessons)
+        ])
+        yield course
+        transaction.set_rollback(True)
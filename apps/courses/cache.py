@@ -0,0 +1,114 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common import surrogate
+from .models import Course
+
+OUTLINE_TIMEOUT = 60 * 60
+# Stamps outlive everything cached under them; one that expires is replaced by a newer stamp,
+# which only costs a cache miss, and ids that are looked up once don't stay in the cache forever.
+STAMP_TIMEOUT = 60 * 60 * 24 * 7
+HITS_KEY = 'course:outline:hits'
+MISSES_KEY = 'course:outline:misses'
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+# Surrogate key of the public course list pages
+CATALOGUE_SURROGATE_KEY = 'course-list'
+
+
+def _version_key(course_id):
+    return f'course:{course_id}:version'
+
+
+def course_surrogate_key(course_id):
+    """Surrogate key of a course's public pages (outline and free previews)."""
+    return f'course-{course_id}'
+
+
+def version_stamp(key):
+    """The stamp stored under ``key``, created on first use."""
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=STAMP_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_stamp(key):
+    """Replace the stamp under ``key``, invalidating everything cached with the old one."""
+    def bump():
+        cache.set(key, time.time_ns(), timeout=STAMP_TIMEOUT)
+
+    # Bump now for readers in this transaction and again after commit, so an
+    # outline rebuilt from pre-commit data is never stored under the new stamp.
+    bump()
+    transaction.on_commit(bump)
+
+
+def course_version(course_id):
+    """
+    Version stamp of a course tree. Stamps are nanosecond timestamps rather
+    than a counter, so a stamp lost to eviction can never come back with a
+    value an old cached outline was stored under.
+    """
+    return version_stamp(_version_key(course_id))
+
+
+def existing_course_version(course_id):
+    """
+    ``course_version`` for anonymous callers: None, and no stamp created,
+    when there is no such course.
+    """
+    version = cache.get(_version_key(course_id))
+    if version is None and not Course.objects.filter(pk=course_id).exists():
+        return None
+    return version or course_version(course_id)
+
+
+def bump_course_version(course_id):
+    bump_stamp(_version_key(course_id))
+    surrogate.purge([course_surrogate_key(course_id)])
+
+
+def catalogue_version():
+    """Version stamp of the public course list; see ``bump_catalogue_version``."""
+    return version_stamp(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    """
+    Called when a course is created, edited or deleted. Counter changes
+    (enrollments, lesson counts) don't bump it: list pages pick those up
+    when they expire.
+    """
+    bump_stamp(CATALOGUE_VERSION_KEY)
+    surrogate.purge([CATALOGUE_SURROGATE_KEY])
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_course_outline(course_id, build):
+    """Serialized course tree from cache, calling ``build()`` on a miss."""
+    key = f'course:{course_id}:outline:{course_version(course_id)}'
+    data = cache.get(key)
+    if data is not None:
+        _count(HITS_KEY)
+        return data
+    _count(MISSES_KEY)
+    data = build()
+    cache.set(key, data, OUTLINE_TIMEOUT)
+    return data
+
+
+def outline_cache_stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counters.get(HITS_KEY, 0), counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
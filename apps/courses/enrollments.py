@@ -0,0 +1,136 @@
+"""
+Enrollment write paths.
+
+``enroll`` is the single-user fast path: one INSERT ... SELECT ... ON CONFLICT
+DO NOTHING that creates the row only if the course exists and the user isn't
+enrolled yet. ``bulk_enroll`` loads whole cohorts with chunked
+``bulk_create(ignore_conflicts=True)``. Neither sends post_save, so both call
+``enrollments_changed`` themselves, the same hook the Enrollment signals use.
+
+``enrolled_course_ids`` keeps each user's enrolled course ids as a cached set,
+so access checks never have to join Lesson -> Chapter -> Course -> Enrollment.
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import analytics, instructors
+from .models import Course, Enrollment
+
+CHUNK_SIZE = 1000
+MEMBERSHIP_TIMEOUT = 60 * 60 * 24
+
+
+def _membership_key(user_id):
+    return f'enrollments:user:{user_id}:courses'
+
+
+def enrolled_course_ids(user_id):
+    key = _membership_key(user_id)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(Enrollment.objects.filter(user_id=user_id).values_list('course_id', flat=True))
+        cache.set(key, course_ids, MEMBERSHIP_TIMEOUT)
+    return course_ids
+
+
+def is_enrolled(user_id, course_id):
+    return course_id in enrolled_course_ids(user_id)
+
+
+def forget_memberships(user_ids):
+    keys = [_membership_key(user_id) for user_id in user_ids]
+    if keys:
+        # Again after commit, in case a reader cached the pre-commit set meanwhile.
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def enrollments_changed(deltas, user_ids=(), enrolled_at=None):
+    """
+    ``deltas`` maps course id to the number of enrollments added (or removed,
+    if negative); ``user_ids`` are the users whose enrollments changed and
+    ``enrolled_at`` is when those enrollments were made (default: now).
+    """
+    # Only the counter moves: the course outline doesn't include it, so its version isn't bumped.
+    for course_id, delta in deltas.items():
+        if delta:
+            Course.objects.filter(pk=course_id).adjust_counters(enrollments_count=delta)
+    analytics.record(deltas, enrolled_at or timezone.now())
+    instructors.forget_stats(course_ids=[course_id for course_id, delta in deltas.items() if delta])
+    forget_memberships(user_ids)
+
+
+def enroll(user, course_id):
+    """Enroll ``user``; returns False if already enrolled, raises Course.DoesNotExist."""
+    quote = connection.ops.quote_name
+    now = timezone.now()
+    enrolled_at = Enrollment._meta.get_field('enrolled_at').get_db_prep_value(now, connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(Enrollment._meta.db_table)} (user_id, course_id, enrolled_at, completed_lessons) "
+            f"SELECT %s, id, %s, 0 FROM {quote(Course._meta.db_table)} WHERE id = %s "
+            f"ON CONFLICT (user_id, course_id) DO NOTHING",
+            [user.pk, enrolled_at, course_id],
+        )
+        created = cursor.rowcount == 1
+    if created:
+        Enrollment.objects.filter(user=user, course_id=course_id).rebuild_progress()
+        enrollments_changed({course_id: 1}, [user.pk], enrolled_at=now)
+    elif not Course.objects.filter(pk=course_id).exists():
+        raise Course.DoesNotExist
+    return created
+
+
+def _existing(model, ids):
+    ids = list(ids)
+    found = set()
+    for start in range(0, len(ids), CHUNK_SIZE):
+        found.update(model.objects.filter(pk__in=ids[start:start + CHUNK_SIZE]).values_list('pk', flat=True))
+    return found
+
+
+def _counts(course_ids):
+    return dict(
+        Enrollment.objects.filter(course_id__in=course_ids).order_by()
+        .values_list('course_id').annotate(n=Count('pk'))
+    )
+
+
+def bulk_enroll(pairs, chunk_size=CHUNK_SIZE):
+    """
+    Enroll ``(user_id, course_id)`` pairs. Unknown users or courses are
+    reported, not raised; pairs that are already enrolled are skipped.
+    """
+    pairs = set(pairs)
+    users = _existing(get_user_model(), {user_id for user_id, _ in pairs})
+    courses = _existing(Course, {course_id for _, course_id in pairs})
+    valid = sorted((user_id, course_id) for user_id, course_id in pairs if user_id in users and course_id in courses)
+
+    now = timezone.now()
+    with transaction.atomic():
+        before = _counts(courses)
+        for start in range(0, len(valid), chunk_size):
+            Enrollment.objects.bulk_create(
+                [Enrollment(user_id=user_id, course_id=course_id) for user_id, course_id in valid[start:start + chunk_size]],
+                ignore_conflicts=True,
+            )
+        after = _counts(courses)
+        created = Counter({course_id: after.get(course_id, 0) - before.get(course_id, 0) for course_id in courses})
+        if valid:
+            Enrollment.objects.filter(
+                user_id__in={user_id for user_id, _ in valid}, course_id__in=courses, completed_lessons=0,
+            ).rebuild_progress()
+        enrollments_changed(created, {user_id for user_id, _ in valid}, enrolled_at=now)
+
+    total = sum(created.values())
+    return {
+        'created': total,
+        'skipped': len(valid) - total,
+        'unknown_users': sorted({user_id for user_id, _ in pairs} - users),
+        'unknown_courses': sorted({course_id for _, course_id in pairs} - courses),
+    }
@@ -0,0 +1,122 @@
+"""
+Streaming exports (NDJSON or CSV) of the course catalogue and of enrollments.
+
+Rows are produced lazily from ``.iterator(chunk_size=...)`` (server-side
+cursors on PostgreSQL), so memory stays flat however large the tables are.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Course, Enrollment
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COURSE_CSV_HEADER = [
+    'course_id', 'course_title', 'level', 'created_by', 'course_created_at',
+    'chapter_id', 'chapter_title', 'chapter_order',
+    'lesson_id', 'lesson_title', 'lesson_order', 'is_free_preview', 'video_url', 'content',
+]
+ENROLLMENT_FIELDS = ['id', 'user_id', 'user__username', 'course_id', 'course__title', 'enrolled_at']
+
+
+class Echo:
+    """File-like object whose ``write`` hands the row straight back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _courses():
+    return Course.objects.with_outline().order_by('pk').iterator(chunk_size=CHUNK_SIZE)
+
+
+def course_documents():
+    for course in _courses():
+        yield {
+            'id': course.pk,
+            'title': course.title,
+            'description': course.description,
+            'level': course.level,
+            'created_by': course.created_by.username,
+            'created_at': course.created_at,
+            'chapters': [
+                {
+                    'id': chapter.pk,
+                    'title': chapter.title,
+                    'order': chapter.order,
+                    'lessons': [
+                        {
+                            'id': lesson.pk,
+                            'title': lesson.title,
+                            'content': lesson.content,
+                            'video_url': lesson.video_url,
+                            'order': lesson.order,
+                            'is_free_preview': lesson.is_free_preview,
+                        }
+                        for lesson in chapter.lessons.all()
+                    ],
+                }
+                for chapter in course.chapters.all()
+            ],
+        }
+
+
+def course_rows():
+    yield COURSE_CSV_HEADER
+    for course in _courses():
+        head = [course.pk, course.title, course.level, course.created_by.username, course.created_at.isoformat()]
+        chapters = course.chapters.all()
+        if not chapters:
+            yield head + [''] * 9
+        for chapter in chapters:
+            chapter_head = head + [chapter.pk, chapter.title, chapter.order]
+            lessons = chapter.lessons.all()
+            if not lessons:
+                yield chapter_head + [''] * 6
+            for lesson in lessons:
+                yield chapter_head + [
+                    lesson.pk, lesson.title, lesson.order, lesson.is_free_preview, lesson.video_url or '', lesson.content,
+                ]
+
+
+def _enrollments():
+    return Enrollment.objects.order_by('pk').values_list(*ENROLLMENT_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+
+
+def enrollment_documents():
+    keys = ['id', 'user', 'username', 'course', 'course_title', 'enrolled_at']
+    for row in _enrollments():
+        yield dict(zip(keys, row))
+
+
+def enrollment_rows():
+    yield ['id', 'user_id', 'username', 'course_id', 'course_title', 'enrolled_at']
+    for row in _enrollments():
+        yield row[:-1] + (row[-1].isoformat(),)
+
+
+def _ndjson(documents):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for document in documents:
+        yield encoder.encode(document) + '\n'
+
+
+def _csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream(name, output, documents, rows):
+    """StreamingHttpResponse for ``output`` ('ndjson' or 'csv')."""
+    content = _csv(rows()) if output == 'csv' else _ndjson(documents())
+    response = StreamingHttpResponse(content, content_type=FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
@@ -0,0 +1,40 @@
+"""
+Filtersets for the course API. Foreign keys are filtered by plain id: the
+default ModelChoiceFilter loads the related row just to validate the value,
+one more query on every filtered list.
+"""
+from django_filters import rest_framework as filters
+
+from .models import Chapter, Course, Enrollment, Lesson
+
+
+class CourseFilter(filters.FilterSet):
+    created_by = filters.NumberFilter()
+
+    class Meta:
+        model = Course
+        fields = ['level', 'created_by']
+
+
+class ChapterFilter(filters.FilterSet):
+    course = filters.NumberFilter()
+
+    class Meta:
+        model = Chapter
+        fields = ['course']
+
+
+class LessonFilter(filters.FilterSet):
+    chapter = filters.NumberFilter()
+
+    class Meta:
+        model = Lesson
+        fields = ['chapter']
+
+
+class EnrollmentFilter(filters.FilterSet):
+    course = filters.NumberFilter()
+
+    class Meta:
+        model = Enrollment
+        fields = ['course']
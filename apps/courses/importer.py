@@ -0,0 +1,117 @@
+"""
+Bulk import of courses from NDJSON: one course per line, with its chapters
+and lessons nested the same way CourseImportSerializer describes them.
+
+Lines are validated one by one and written in batches, one ``bulk_create``
+per level inside a transaction per batch. Invalid lines are reported and
+skipped; if a batch fails in the database it is retried row by row so only
+the offending lines are lost.
+"""
+import json
+
+from django.db import DatabaseError, transaction
+
+from . import instructors, search, similarity
+from .cache import bump_catalogue_version
+from .models import Course, Chapter, Lesson
+from .ordering import ORDER_GAP
+from .serializers import CourseImportSerializer
+
+MAX_REPORTED_ERRORS = 1000
+
+
+def _write(batch, user):
+    courses, chapters, chapter_lessons = [], [], []
+    with transaction.atomic():
+        for data in batch:
+            fields = {key: value for key, value in data.items() if key != 'chapters'}
+            chapter_items = data.get('chapters', [])
+            # bulk_create skips the signals that maintain counters, so they are set up front.
+            courses.append(Course(
+                created_by=user,
+                chapters_count=len(chapter_items),
+                lessons_count=sum(len(item.get('lessons', [])) for item in chapter_items),
+                **fields
+            ))
+        Course.objects.bulk_create(courses)
+
+        for course, data in zip(courses, batch):
+            for index, item in enumerate(data.get('chapters', []), start=1):
+                chapters.append(Chapter(
+                    course=course, title=item['title'], order=item.get('order', index * ORDER_GAP)
+                ))
+                chapter_lessons.append(item.get('lessons', []))
+        Chapter.objects.bulk_create(chapters)
+
+        lessons = []
+        for chapter, items in zip(chapters, chapter_lessons):
+            for index, item in enumerate(items, start=1):
+                item = dict(item)
+                item.setdefault('order', index * ORDER_GAP)
+                lessons.append(Lesson(chapter=chapter, **item))
+        Lesson.objects.bulk_create(lessons, batch_size=1000)
+
+        # Likewise for the search index.
+        search.index_courses(courses)
+        search.index_lessons([(lesson, lesson.chapter.course_id) for lesson in lessons])
+        similarity.update([course.pk for course in courses])
+        instructors.forget_stats([user.pk])
+        bump_catalogue_version()
+    return courses
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def _flush(batch, user, report):
+    if not batch:
+        return
+    try:
+        _write([data for _, data in batch], user)
+        report.created += len(batch)
+    except DatabaseError:
+        for line, data in batch:
+            try:
+                _write([data], user)
+                report.created += 1
+            except DatabaseError as exc:
+                report.error(line, {'non_field_errors': [str(exc)]})
+
+
+def import_courses(lines, user, batch_size=500):
+    """Import NDJSON ``lines`` (str or bytes) as courses owned by ``user``."""
+    report = ImportReport()
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            report.error(line_number, {'non_field_errors': [f"Invalid JSON: {exc}"]})
+            continue
+        serializer = CourseImportSerializer(data=record)
+        if not serializer.is_valid():
+            report.error(line_number, serializer.errors)
+            continue
+        batch.append((line_number, serializer.validated_data))
+        if len(batch) >= batch_size:
+            _flush(batch, user, report)
+            batch = []
+    _flush(batch, user, report)
+    return report.as_dict()
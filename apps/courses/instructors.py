@@ -0,0 +1,64 @@
+"""
+Instructor dashboard totals.
+
+Everything comes from the counters maintained on Course and from the daily
+enrollment rollups, aggregated in one query over the instructor's courses,
+and is cached per instructor. The signals and ``enrollments_changed`` drop
+the cached totals whenever one of those counters moves.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import analytics
+from .models import Course, EnrollmentRollup
+
+STATS_TIMEOUT = 60 * 10
+RECENT_DAYS = 30
+
+
+def _recent_start():
+    return timezone.localdate(timezone=analytics.local_zone()) - timedelta(days=RECENT_DAYS - 1)
+
+
+def _stats_key(user_id):
+    # The window start is part of the key, so cached totals roll over at local midnight.
+    return f'instructor:{user_id}:stats:{_recent_start()}'
+
+
+def compute_stats(user_id):
+    recent = (
+        EnrollmentRollup.objects.filter(course=OuterRef('pk'), period=EnrollmentRollup.DAY, bucket__gte=_recent_start())
+        .order_by().values('course').annotate(n=Sum('count')).values('n')
+    )
+    return Course.objects.filter(created_by_id=user_id).aggregate(
+        courses=Count('pk'),
+        chapters=Coalesce(Sum('chapters_count'), 0),
+        lessons=Coalesce(Sum('lessons_count'), 0),
+        enrollments=Coalesce(Sum('enrollments_count'), 0),
+        recent_enrollments=Coalesce(Sum(Subquery(recent)), 0),
+    )
+
+
+def instructor_stats(user_id):
+    key = _stats_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = {**compute_stats(user_id), 'recent_days': RECENT_DAYS}
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
+
+
+def forget_stats(user_ids=(), course_ids=()):
+    """Drop the cached totals of ``user_ids`` and of the authors of ``course_ids``."""
+    user_ids = set(user_ids)
+    if course_ids:
+        user_ids.update(Course.objects.filter(pk__in=course_ids).values_list('created_by_id', flat=True))
+    keys = [_stats_key(user_id) for user_id in user_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses import analytics
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day and per-week enrollment rollups from the Enrollment table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses', help="Only this course (repeatable)")
+
+    def handle(self, *args, **options):
+        analytics.backfill(options['courses'])
+        self.stdout.write(self.style.SUCCESS("Enrollment rollups rebuilt"))
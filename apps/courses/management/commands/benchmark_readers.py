@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.common.readers import ValuesReader
+from apps.courses.benchmarks import throwaway_course
+from apps.courses.models import Chapter, Course, Lesson
+from apps.courses.serializers import ChapterSerializer, CourseSerializer, LessonSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare ModelSerializer output with the values() reader for one large course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        with throwaway_course(options['lessons']) as course:
+            cases = [
+                ('lessons', LessonSerializer, Lesson.objects.filter(chapter__course=course), options['lessons']),
+                ('chapters', ChapterSerializer, Chapter.objects.with_lessons().filter(course=course),
+                 course.chapters.count()),
+                ('course', CourseSerializer, Course.objects.with_outline().filter(pk=course.pk), 1),
+            ]
+            self.stdout.write(f"{'endpoint':<10} {'objects':>8} {'serializer ms':>14} {'reader ms':>10} {'speedup':>8}")
+            for name, serializer_class, queryset, objects in cases:
+                reader = ValuesReader.for_serializer(serializer_class)
+                serializer_ms = self.timed(lambda: serializer_class(queryset.all(), many=True).data, repeat)
+                reader_ms = self.timed(lambda: reader.read(queryset.all()), repeat)
+                self.stdout.write(
+                    f"{name:<10} {objects:>8} {serializer_ms:>14.1f} {reader_ms:>10.1f} "
+                    f"{serializer_ms / reader_ms:>7.1f}x"
+                )
+
+    @staticmethod
+    def timed(func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,45 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.common.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer
+from apps.courses.benchmarks import throwaway_course
+from apps.courses.models import Course
+from apps.courses.serializers import CourseSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the API renderers and parsers on CourseSerializer output for one large course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lessons', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        data = self.course_data(options['lessons'])
+        repeat = options['repeat']
+        pairs = [
+            ('json (DRF)', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+            ('msgpack', MessagePackRenderer(), MessagePackParser()),
+        ]
+        self.stdout.write(f"{'renderer':<12} {'bytes':>9} {'render ms':>10} {'parse ms':>10}")
+        for name, renderer, parser in pairs:
+            body = renderer.render(data)
+            render_ms = self.timed(lambda: renderer.render(data), repeat)
+            parse_ms = self.timed(lambda: parser.parse(io.BytesIO(body)), repeat)
+            self.stdout.write(f"{name:<12} {len(body):>9} {render_ms:>10.3f} {parse_ms:>10.3f}")
+
+    @staticmethod
+    def timed(func, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    def course_data(self, lessons):
+        with throwaway_course(lessons) as course:
+            return CourseSerializer(Course.objects.with_outline().get(pk=course.pk)).data
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.courses.recommendations import TOP_K, build
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"students also enrolled in\" table from the co-enrollment matrix"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=TOP_K)
+        parser.add_argument(
+            '--since-hours', type=float,
+            help="Only rebuild courses affected by enrollments from the last N hours",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since_hours'] is not None:
+            since = timezone.now() - timedelta(hours=options['since_hours'])
+        rebuilt = build(top_k=options['top_k'], since=since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related courses for {rebuilt} courses"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.cache import outline_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the course outline cache"
+
+    def handle(self, *args, **options):
+        stats = outline_cache_stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}  misses: {stats['misses']}  hit ratio: {stats['hit_ratio']:.1%}"
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses import progress
+
+
+class Command(BaseCommand):
+    help = "Write buffered lesson progress events to the database (run periodically, e.g. every minute)"
+
+    def handle(self, *args, **options):
+        flushed = progress.flush()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} progress events, {progress.pending()} pending"))
@@ -0,0 +1,32 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.courses.importer import import_courses
+
+
+class Command(BaseCommand):
+    help = "Import courses with chapters and lessons from an NDJSON file ('-' for stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username of the course author")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist")
+
+        if options['path'] == '-':
+            report = import_courses(sys.stdin, user, batch_size=options['batch_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                report = import_courses(lines, user, batch_size=options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} courses, {report['failed']} failed"))
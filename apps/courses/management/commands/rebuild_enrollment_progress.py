@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.models import Enrollment
+
+
+class Command(BaseCommand):
+    help = "Recompute completed_lessons on every enrollment from lesson progress"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(Enrollment.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            Enrollment.objects.filter(pk__in=ids[start:start + batch_size]).rebuild_progress()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt progress of {len(ids)} enrollments"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.courses import search
+from apps.courses.models import Course, Lesson
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of courses and lessons"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            search.clear_index()
+            courses = Course.objects.only('id', 'title', 'description').order_by('pk')
+            batch = []
+            for course in courses.iterator(chunk_size=batch_size):
+                batch.append(course)
+                if len(batch) == batch_size:
+                    search.index_courses(batch)
+                    batch = []
+            search.index_courses(batch)
+
+            lessons = Lesson.objects.select_related('chapter').only(
+                'id', 'title', 'content', 'chapter__course_id'
+            ).order_by('pk')
+            batch = []
+            for lesson in lessons.iterator(chunk_size=batch_size):
+                batch.append((lesson, lesson.chapter.course_id))
+                if len(batch) == batch_size:
+                    search.index_lessons(batch)
+                    batch = []
+            search.index_lessons(batch)
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.courses import similarity
+from apps.courses.models import Course, CourseVector
+
+
+class Command(BaseCommand):
+    help = "Recompute the TF-IDF vectors of every course for the similar-courses index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        with transaction.atomic():
+            CourseVector.objects.all().delete()
+            for start in range(0, len(ids), batch_size):
+                similarity.update(ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Vectorized {len(ids)} courses"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Recompute chapters_count, lessons_count and enrollments_count on every course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            Course.objects.filter(pk__in=ids[start:start + batch_size]).reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters of {len(ids)} courses"))
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Chapter = apps.get_model('courses', 'Chapter')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+
+    def count(model, lookup):
+        return Coalesce(Subquery(
+            model.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+            .annotate(n=Count('pk')).values('n')
+        ), 0)
+
+    Course.objects.update(
+        chapters_count=count(Chapter, 'course'),
+        lessons_count=count(Lesson, 'chapter__course'),
+        enrollments_count=count(Enrollment, 'course'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='chapters_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lessons_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-enrollments_count', '-id'], name='course_popular_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
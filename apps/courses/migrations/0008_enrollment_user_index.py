@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_course_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', '-enrolled_at', '-id'], name='enrollment_user_idx'),
+        ),
+    ]
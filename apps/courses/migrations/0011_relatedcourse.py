@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_enrollment_completed_lessons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedCourse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related', to='courses.course')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_relatedcourse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseVector',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='courses.course')),
+                ('terms', models.BinaryField()),
+                ('weights', models.BinaryField()),
+            ],
+        ),
+    ]
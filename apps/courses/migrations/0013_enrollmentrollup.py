@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_coursevector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('bucket', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='enrollment_rollups', to='courses.course')),
+            ],
+            options={
+                'unique_together': {('course', 'period', 'bucket')},
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_enrollmentrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chapter',
+            options={'ordering': ['course_id', 'order', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='lesson',
+            options={'ordering': ['chapter_id', 'order', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='chapter',
+            index=models.Index(fields=['course', 'order', 'id'], name='chapter_course_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['level', '-created_at', '-id'], name='course_level_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='course_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', '-enrolled_at', '-id'], name='enrollment_course_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['chapter', 'order', 'id'], name='lesson_chapter_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('is_free_preview', True)), fields=['id'], name='lesson_preview_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(fields=['user', '-updated_at', '-id'], name='progress_user_updated_idx'),
+        ),
+    ]
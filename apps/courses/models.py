@@ -1,6 +1,80 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 
+
+class CourseQuerySet(models.QuerySet):
+    def with_outline(self):
+        """Author, chapters and lessons in three queries, whatever the page size."""
+        chapters = Chapter.objects.with_lessons()
+        return self.select_related('created_by').prefetch_related(Prefetch('chapters', queryset=chapters))
+
+    def for_listing(self):
+        """Catalogue card columns only; description and lesson bodies stay in the database."""
+        return self.select_related('created_by').only(
+            'id', 'title', 'level', 'created_at', 'created_by__username', *Course.COUNTER_FIELDS
+        )
+
+    def adjust_counters(self, **deltas):
+        """
+        Atomically add ``deltas`` to counter columns, e.g. ``adjust_counters(lessons_count=1)``.
+        Decrements stop at zero: a counter that drifted must not make a delete fail its CHECK.
+        """
+        return self.update(**{
+            field: F(field) + delta if delta >= 0 else Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+
+    def reconcile_counters(self):
+        """Recompute the denormalized counters from the child tables."""
+        def count(queryset, lookup):
+            return Coalesce(Subquery(
+                queryset.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+                .annotate(n=Count('pk')).values('n')
+            ), 0)
+
+        return self.update(
+            chapters_count=count(Chapter.objects.all(), 'course'),
+            lessons_count=count(Lesson.objects.all(), 'chapter__course'),
+            enrollments_count=count(Enrollment.objects.all(), 'course'),
+        )
+
+
+class ChapterQuerySet(models.QuerySet):
+    def with_lessons(self):
+        lessons = Lesson.objects.order_by('chapter_id', 'order', 'id')
+        return self.order_by('course_id', 'order', 'id').prefetch_related(Prefetch('lessons', queryset=lessons))
+
+
+class EnrollmentQuerySet(models.QuerySet):
+    def with_outline(self):
+        chapters = Chapter.objects.with_lessons()
+        return self.select_related('course__created_by').prefetch_related(
+            Prefetch('course__chapters', queryset=chapters)
+        )
+
+    def for_summary(self):
+        """Enrollment plus its course card in one query, counts read from the counter columns."""
+        course_fields = ['course__' + field for field in ('id', 'title', 'level', 'created_at', *Course.COUNTER_FIELDS)]
+        return self.select_related('course__created_by').only(
+            'id', 'enrolled_at', 'completed_lessons', 'course__created_by__username', *course_fields
+        )
+
+    def rebuild_progress(self):
+        """
+        Recompute completed_lessons from LessonProgress. Completions from
+        before the enrollment only count for free previews.
+        """
+        completed = (
+            LessonProgress.objects.filter(
+                Q(lesson__is_free_preview=True) | Q(completed_at__gte=OuterRef('enrolled_at')),
+                user=OuterRef('user'), lesson__chapter__course=OuterRef('course'), completed=True,
+            ).order_by().values('user').annotate(n=Count('pk')).values('n')
+        )
+        return self.update(completed_lessons=Coalesce(Subquery(completed), 0))
+
+
 class Course(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -10,15 +84,50 @@ class Course(models.Model):
     )
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained with F() updates from signals; never written by a plain save()
+    chapters_count = models.PositiveIntegerField(default=0)
+    lessons_count = models.PositiveIntegerField(default=0)
+    enrollments_count = models.PositiveIntegerField(default=0)
+
+    COUNTER_FIELDS = ('chapters_count', 'lessons_count', 'enrollments_count')
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+            models.Index(fields=['-enrollments_count', '-id'], name='course_popular_idx'),
+            models.Index(fields=['level', '-created_at', '-id'], name='course_level_created_idx'),
+            models.Index(fields=['created_by', '-created_at', '-id'], name='course_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # An edit must not write back counter values read before a concurrent F() update.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skip = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skip
+            ]
+        super().save(*args, **kwargs)
+
 class Chapter(models.Model):
     course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='chapters')
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField(default=0)  # bo‘lim tartibi
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ChapterQuerySet.as_manager()
+
+    class Meta:
+        # course_id, not course: ordering by the relation would join Course.
+        ordering = ['course_id', 'order', 'id']
+        indexes = [models.Index(fields=['course', 'order', 'id'], name='chapter_course_order_idx')]
 
     def __str__(self):
         return f"{self.course.title} – {self.title}"
@@ -31,6 +140,15 @@ class Lesson(models.Model):
     video_url = models.URLField(blank=True, null=True)  # video dars (YouTube, Vimeo...)
     order = models.PositiveIntegerField(default=0)
     is_free_preview = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['chapter_id', 'order', 'id']
+        indexes = [
+            models.Index(fields=['chapter', 'order', 'id'], name='lesson_chapter_order_idx'),
+            # Only the free previews, which are few; see IsEnrolledOrFreePreview.filter_queryset.
+            models.Index(fields=['id'], condition=models.Q(is_free_preview=True), name='lesson_preview_idx'),
+        ]
 
     def __str__(self):
         return f"{self.chapter.title} – {self.title}"
@@ -41,9 +159,96 @@ class Enrollment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     enrolled_at = models.DateTimeField(auto_now_add=True)
+    # Tugatilgan darslar soni; jami darslar soni course.lessons_count da
+    completed_lessons = models.PositiveIntegerField(default=0)
+
+    objects = EnrollmentQuerySet.as_manager()
 
     class Meta:
         unique_together = ['user', 'course']
+        indexes = [
+            models.Index(fields=['-enrolled_at', '-id'], name='enrollment_enrolled_idx'),
+            models.Index(fields=['user', '-enrolled_at', '-id'], name='enrollment_user_idx'),
+            models.Index(fields=['course', '-enrolled_at', '-id'], name='enrollment_course_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} → {self.course.title}"
+
+    @property
+    def progress_percent(self):
+        total = self.course.lessons_count
+        return round(100 * min(self.completed_lessons, total) / total, 1) if total else 0.0
+
+
+class LessonProgress(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lesson_progress')
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='progress')
+    position = models.PositiveIntegerField(default=0)  # video/matn bo‘yicha pozitsiya (soniya)
+    completed = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Largest value of a PositiveIntegerField / BigAutoField on every supported database
+    MAX_POSITION = 2 ** 31 - 1
+    MAX_ID = 2 ** 63 - 1
+
+    class Meta:
+        unique_together = ['user', 'lesson']
+        indexes = [models.Index(fields=['user', '-updated_at', '-id'], name='progress_user_updated_idx')]
+
+    def __str__(self):
+        return f"{self.user_id} → {self.lesson_id} ({self.position}s)"
+
+
+class RelatedCourseQuerySet(models.QuerySet):
+    def for_course(self, course_id):
+        related_fields = ['related__' + field for field in ('id', 'title', 'level', 'created_at', *Course.COUNTER_FIELDS)]
+        return self.filter(course_id=course_id).select_related('related__created_by').only(
+            'id', 'course_id', 'score', 'rank', 'related__created_by__username', *related_fields
+        ).order_by('rank')
+
+
+class RelatedCourse(models.Model):
+    """Precomputed "students also enrolled in" neighbours; rebuilt by build_related_courses."""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='related')
+    related = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()  # ikkala kursga ham yozilgan talabalar soni
+    rank = models.PositiveSmallIntegerField()
+
+    objects = RelatedCourseQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ['course', 'rank']
+
+    def __str__(self):
+        return f"{self.course_id} → {self.related_id} ({self.score})"
+
+
+class CourseVector(models.Model):
+    """Hashed term frequencies of a course's text for the TF-IDF similarity index (see similarity.py)."""
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    terms = models.BinaryField()  # int32 term id lari, o‘sish tartibida
+    weights = models.BinaryField()  # float32, 1 + log(tf)
+    # Loaded indexes re-read only the vectors written since they were built.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"vector of {self.course_id}"
+
+
+class EnrollmentRollup(models.Model):
+    """Enrollments per course per day/week (Asia/Tashkent dates), kept up to date by analytics.record."""
+    DAY, WEEK = 'day', 'week'
+    PERIODS = [(DAY, "Day"), (WEEK, "Week")]
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollment_rollups')
+    period = models.CharField(max_length=4, choices=PERIODS)
+    bucket = models.DateField()  # kun yoki haftaning dushanbasi
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['course', 'period', 'bucket']
 
     def __str__(self):
-        return f"{self.user.username} → {self.course.title}"
\ No newline at end of file
+        return f"{self.course_id} {self.period} {self.bucket}: {self.count}"
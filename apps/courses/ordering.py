@@ -0,0 +1,104 @@
+"""
+Gap-based ordering for chapters and lessons.
+
+Siblings are numbered ``ORDER_GAP`` apart, so moving one item normally means
+giving it a free number between its new neighbours and writing that single row.
+Only when there is no room left are the siblings renumbered, still in one
+``bulk_update``.
+"""
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+ORDER_GAP = 1024
+
+
+def next_position(siblings):
+    return (siblings.aggregate(last=Max('order'))['last'] or 0) + ORDER_GAP
+
+
+def _increasing_run(values):
+    """Indexes of a longest strictly increasing subsequence of ``values``."""
+    tails, tail_indexes, previous = [], [], [None] * len(values)
+    for index, value in enumerate(values):
+        slot = bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = value
+            tail_indexes[slot] = index
+        previous[index] = tail_indexes[slot - 1] if slot else None
+    run, index = [], tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        run.append(index)
+        index = previous[index]
+    return set(run)
+
+
+def _positions(current):
+    """
+    New order values for ``current`` (old values, in the wanted order) that
+    keep as many rows as possible untouched, or None if the gaps are too small.
+    """
+    keep = _increasing_run(current)
+    positions = list(current)
+    index = 0
+    while index < len(current):
+        if index in keep:
+            index += 1
+            continue
+        end = index
+        while end < len(current) and end not in keep:
+            end += 1
+        low = positions[index - 1] if index else -1
+        count = end - index
+        if end < len(current):
+            step = (current[end] - low) // (count + 1)
+            if step < 1:
+                return None
+        else:
+            step = ORDER_GAP
+        for offset in range(count):
+            positions[index + offset] = low + step * (offset + 1)
+        index = end
+    return positions
+
+
+def reorder(siblings, ids):
+    """
+    Put ``siblings`` (all children of one parent) into the order of ``ids``.
+    Returns the rows that were written.
+    """
+    model = siblings.model
+    with transaction.atomic():
+        rows = {row.pk: row for row in siblings.select_for_update().only('id', 'order')}
+        if len(ids) != len(rows) or set(ids) != set(rows):
+            raise ValidationError({'order': "Must list every sibling exactly once."})
+        current = [rows[pk].order for pk in ids]
+        positions = _positions(current) or [ORDER_GAP * (index + 1) for index in range(len(ids))]
+        now = timezone.now()
+        changed = []
+        for pk, position in zip(ids, positions):
+            row = rows[pk]
+            if row.order != position:
+                row.order = position
+                row.updated_at = now
+                changed.append(row)
+        model.objects.bulk_update(changed, ['order', 'updated_at'])
+    return changed
+
+
+def move(siblings, obj, after=None):
+    """Place ``obj`` right after the sibling with pk ``after`` (first when None)."""
+    ids = [pk for pk in siblings.order_by('order', 'id').values_list('pk', flat=True) if pk != obj.pk]
+    if after is None:
+        ids.insert(0, obj.pk)
+    elif after in ids:
+        ids.insert(ids.index(after) + 1, obj.pk)
+    else:
+        raise ValidationError({'after': "Not a sibling of this item."})
+    return reorder(siblings, ids)
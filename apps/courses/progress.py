@@ -0,0 +1,211 @@
+"""
+Buffered lesson progress.
+
+Players report progress every few seconds; writing each heartbeat to the
+database would mean one UPDATE per viewer per heartbeat. Instead ``record``
+appends events to a write buffer in the cache (a sequence number from
+``cache.incr`` plus one key per event) and ``flush`` periodically coalesces
+everything buffered into one row per (user, lesson) and writes those with a
+single ``bulk_update``/``bulk_create``.
+
+What can be lost in a crash is bounded by what is buffered: a web worker
+dying loses nothing (events are already in the cache); losing the cache
+itself loses at most the events since the last flush, which is capped by
+LESSON_PROGRESS_FLUSH_BATCH events or one run of ``flush_lesson_progress``.
+
+Events are accepted without any lookups; the flush drops those for lessons
+the user can't open (see ``_openable``), so progress can't be recorded
+against courses the user never enrolled in.
+
+Completions are also counted onto ``Enrollment.completed_lessons`` in the same
+transaction, so course progress is read from the enrollment row instead of
+being counted from LessonProgress on every request.
+"""
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Enrollment, Lesson, LessonProgress
+
+SEQUENCE_KEY = 'progress:sequence'
+FLUSHED_KEY = 'progress:flushed'
+STALLED_KEY = 'progress:stalled'
+LOCK_KEY = 'progress:flush-lock'
+LOCK_TIMEOUT = 5 * 60
+READ_CHUNK = 1000
+
+
+def _event_key(sequence):
+    return f'progress:event:{sequence}'
+
+
+def record(user_id, events):
+    """
+    Buffer ``events`` (dicts with ``lesson``, ``position`` and ``completed``)
+    for ``user_id``; flushes inline once a full batch is waiting.
+    """
+    if not events:
+        return
+    cache.add(SEQUENCE_KEY, 0, timeout=None)
+    last = cache.incr(SEQUENCE_KEY, len(events))
+    first = last - len(events) + 1
+    cache.set_many(
+        {
+            _event_key(first + index): (user_id, event['lesson'], event['position'], event['completed'])
+            for index, event in enumerate(events)
+        },
+        timeout=settings.LESSON_PROGRESS_BUFFER_TIMEOUT,
+    )
+    if pending() >= settings.LESSON_PROGRESS_FLUSH_BATCH:
+        flush()
+
+
+def pending():
+    return (cache.get(SEQUENCE_KEY) or 0) - (cache.get(FLUSHED_KEY) or 0)
+
+
+def _valid(event):
+    user_id, lesson_id, position, completed = event
+    return (
+        all(isinstance(value, int) for value in (user_id, lesson_id, position))
+        and 0 < lesson_id <= LessonProgress.MAX_ID and 0 <= position <= LessonProgress.MAX_POSITION
+    )
+
+
+def _coalesce(events):
+    state = {}
+    # The API validates events, but whatever is in the buffer is read back here:
+    # one row the database can't store must not keep the whole buffer from flushing.
+    for user_id, lesson_id, position, completed in filter(_valid, events):
+        previous = state.get((user_id, lesson_id))
+        if previous:
+            position, completed = max(position, previous[0]), completed or previous[1]
+        state[(user_id, lesson_id)] = (position, completed)
+    return state
+
+
+def _count_completions(completed_now, lesson_courses):
+    """Add newly completed lessons to the matching enrollments, one UPDATE per (course, count)."""
+    per_enrollment = Counter((user_id, lesson_courses[lesson_id]) for user_id, lesson_id in completed_now)
+    groups = defaultdict(set)
+    for (user_id, course_id), count in per_enrollment.items():
+        groups[course_id, count].add(user_id)
+    for (course_id, count), user_ids in groups.items():
+        Enrollment.objects.filter(course_id=course_id, user_id__in=user_ids).update(
+            completed_lessons=F('completed_lessons') + count
+        )
+
+
+def _openable(state):
+    """
+    The part of ``state`` for existing lessons the user may open (the rules of
+    IsEnrolledOrFreePreview), plus each of those lessons' course id.
+    """
+    lessons = {
+        pk: (course_id, is_free_preview, author_id)
+        for pk, course_id, is_free_preview, author_id in Lesson.objects.filter(
+            pk__in={lesson_id for _, lesson_id in state}
+        ).values_list('pk', 'chapter__course_id', 'is_free_preview', 'chapter__course__created_by_id')
+    }
+    state = {key: value for key, value in state.items() if key[1] in lessons}
+    user_ids = {user_id for user_id, _ in state}
+    locked = {lessons[lesson_id][0] for _, lesson_id in state if not lessons[lesson_id][1]}
+    enrolled, staff = set(), set()
+    if locked:
+        enrolled = set(
+            Enrollment.objects.filter(user_id__in=user_ids, course_id__in=locked).values_list('user_id', 'course_id')
+        )
+        staff = set(get_user_model().objects.filter(pk__in=user_ids, is_staff=True).values_list('pk', flat=True))
+
+    def can_open(user_id, lesson_id):
+        course_id, is_free_preview, author_id = lessons[lesson_id]
+        return is_free_preview or user_id in (author_id, *staff) or (user_id, course_id) in enrolled
+
+    state = {key: value for key, value in state.items() if can_open(*key)}
+    return state, {lesson_id: lessons[lesson_id][0] for _, lesson_id in state}
+
+
+def _write(state):
+    """Apply coalesced progress; returns the (user_id, lesson_id) pairs completed for the first time."""
+    state, lesson_courses = _openable(state)
+    if not state:
+        return []
+    lesson_ids = set(lesson_courses)
+
+    now = timezone.now()
+    to_update, to_create, completed_now = [], [], []
+    with transaction.atomic():
+        existing = {
+            (row.user_id, row.lesson_id): row
+            for row in LessonProgress.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in state}, lesson_id__in=lesson_ids,
+            )
+        }
+        for (user_id, lesson_id), (position, completed) in state.items():
+            row = existing.get((user_id, lesson_id))
+            if row is None:
+                to_create.append(LessonProgress(
+                    user_id=user_id, lesson_id=lesson_id, position=position,
+                    completed=completed, completed_at=now if completed else None,
+                ))
+                if completed:
+                    completed_now.append((user_id, lesson_id))
+                continue
+            newly_completed = completed and not row.completed
+            if position > row.position or newly_completed:
+                row.position = max(position, row.position)
+                if newly_completed:
+                    row.completed, row.completed_at = True, now
+                    completed_now.append((user_id, lesson_id))
+                row.updated_at = now
+                to_update.append(row)
+        LessonProgress.objects.bulk_update(
+            to_update, ['position', 'completed', 'completed_at', 'updated_at'], batch_size=500
+        )
+        LessonProgress.objects.bulk_create(to_create, batch_size=500)
+        _count_completions(completed_now, lesson_courses)
+    return completed_now
+
+
+def complete(user_id, lesson_id):
+    """Mark one lesson completed right away, bypassing the buffer; True if it wasn't already."""
+    return bool(_write({(user_id, lesson_id): (0, True)}))
+
+
+def _read(start, end):
+    """Buffered events after ``start`` up to ``end``; returns them with the last sequence consumed."""
+    stalled = cache.get(STALLED_KEY)
+    events = []
+    for chunk_start in range(start + 1, end + 1, READ_CHUNK):
+        sequences = range(chunk_start, min(chunk_start + READ_CHUNK, end + 1))
+        found = cache.get_many([_event_key(sequence) for sequence in sequences])
+        for sequence in sequences:
+            event = found.get(_event_key(sequence))
+            if event is not None:
+                events.append(event)
+            elif sequence != stalled:
+                # Either a writer is between incr() and set_many(), or the entry
+                # was evicted. Stop here; if it is still missing next time, skip it.
+                cache.set(STALLED_KEY, sequence, timeout=None)
+                return events, sequence - 1
+    return events, end
+
+
+def flush():
+    """Write everything buffered so far; returns the number of events consumed."""
+    if not cache.add(LOCK_KEY, 1, timeout=LOCK_TIMEOUT):
+        return 0
+    try:
+        start = cache.get(FLUSHED_KEY) or 0
+        events, end = _read(start, cache.get(SEQUENCE_KEY) or 0)
+        _write(_coalesce(events))
+        cache.set(FLUSHED_KEY, end, timeout=None)
+        cache.delete_many([_event_key(sequence) for sequence in range(start + 1, end + 1)])
+        return end - start
+    finally:
+        cache.delete(LOCK_KEY)
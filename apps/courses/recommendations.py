@@ -0,0 +1,95 @@
+"""
+"Students also enrolled in" recommendations.
+
+Enrollments are loaded as two integer arrays and turned into a sparse
+user x course matrix X; ``X.T @ X`` is then the course x course co-enrollment
+matrix (entry [a, b] = students enrolled in both a and b). The top-K
+neighbours of every course are written to RelatedCourse, so the API reads a
+handful of rows by course id and never joins Enrollment at request time.
+
+``build(since=...)`` is the incremental variant: a new enrollment of user u
+only changes the rows of u's own courses, so only those rows are recomputed,
+from the enrollments of the students who take them. Unenrollments are not
+tracked that way and are picked up by the next full build.
+"""
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .models import Enrollment, RelatedCourse
+
+TOP_K = 10
+CHUNK_SIZE = 100_000
+
+
+def _arrays(enrollments):
+    """(user_id, course_id) of ``enrollments`` as two int64 arrays, read in chunks."""
+    rows = enrollments.order_by().values_list('user_id', 'course_id').iterator(chunk_size=CHUNK_SIZE)
+    chunks = []
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        chunks.append(np.array(chunk, dtype=np.int64))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.concatenate(chunks)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def co_enrollment(user_ids, course_ids):
+    """Sparse co-enrollment counts (zero diagonal) and the course id of each row/column."""
+    courses, columns = np.unique(course_ids, return_inverse=True)
+    users, rows = np.unique(user_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(len(users), len(courses))
+    )
+    counts = (matrix.T @ matrix).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return counts, courses
+
+
+def top_neighbours(counts, k):
+    """Yield (row, columns, values) with each row's ``k`` largest entries, largest first."""
+    for row in range(counts.shape[0]):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        columns, values = counts.indices[start:end], counts.data[start:end]
+        if len(values) > k:
+            keep = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[keep], values[keep]
+        # Ties go to the older (lower id) course, so rebuilds are stable.
+        order = np.lexsort((columns, -values))
+        yield row, columns[order], values[order]
+
+
+def build(top_k=TOP_K, since=None):
+    """
+    Recompute RelatedCourse; with ``since`` only for the courses of students
+    who enrolled at or after that time. Returns the number of courses rebuilt.
+    """
+    if since is None:
+        enrollments, targets = Enrollment.objects.all(), None
+    else:
+        recent_users = Enrollment.objects.filter(enrolled_at__gte=since).values('user_id')
+        targets = set(Enrollment.objects.filter(user_id__in=recent_users).values_list('course_id', flat=True))
+        if not targets:
+            return 0
+        students = Enrollment.objects.filter(course_id__in=targets).values('user_id')
+        enrollments = Enrollment.objects.filter(user_id__in=students)
+
+    counts, courses = co_enrollment(*_arrays(enrollments))
+    rows = []
+    for row, columns, values in top_neighbours(counts, top_k):
+        course_id = int(courses[row])
+        if targets is not None and course_id not in targets:
+            continue
+        rows.extend(
+            RelatedCourse(course_id=course_id, related_id=int(courses[column]), score=int(value), rank=rank)
+            for rank, (column, value) in enumerate(zip(columns, values))
+        )
+
+    with transaction.atomic():
+        stale = RelatedCourse.objects.all() if targets is None else RelatedCourse.objects.filter(course_id__in=targets)
+        stale.delete()
+        RelatedCourse.objects.bulk_create(rows, batch_size=1000)
+    return len(courses) if targets is None else len(targets)
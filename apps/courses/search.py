@@ -0,0 +1,170 @@
+"""
+Full-text index over course titles/descriptions and lesson titles/content.
+
+The index lives in its own table, ``courses_search``: an FTS5 virtual table on
+SQLite and a tsvector column with a GIN index on PostgreSQL. Rows are keyed by
+``object_id * 2 + kind`` so a single course or lesson can be replaced with a
+primary-key lookup when it is saved.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import strip_tags
+
+COURSE = 'course'
+LESSON = 'lesson'
+KINDS = {COURSE: 0, LESSON: 1}
+MARK_START, MARK_END = '<mark>', '</mark>'
+
+
+def _row_id(kind, object_id):
+    return object_id * 2 + KINDS[kind]
+
+
+class SqliteBackend:
+    def create(self, cursor):
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS courses_search USING fts5("
+            "title, body, kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS courses_search")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany("DELETE FROM courses_search WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            "INSERT INTO courses_search (rowid, kind, object_id, course_id, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s)",
+            rows,
+        )
+
+    def delete(self, cursor, row_ids):
+        cursor.executemany("DELETE FROM courses_search WHERE rowid = %s", [(row_id,) for row_id in row_ids])
+
+    def clear(self, cursor):
+        cursor.execute("DELETE FROM courses_search")
+
+    def search(self, cursor, query, limit):
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return []
+        # Quote every term so user input can't inject FTS5 syntax; the last one matches as a prefix.
+        match = ' '.join('"%s"' % term for term in terms) + '*'
+        cursor.execute(
+            "SELECT kind, object_id, course_id, "
+            "highlight(courses_search, 0, %s, %s), "
+            "snippet(courses_search, 1, %s, %s, '…', 16), "
+            "-bm25(courses_search, 10.0, 1.0) AS rank "
+            "FROM courses_search WHERE courses_search MATCH %s ORDER BY bm25(courses_search, 10.0, 1.0) LIMIT %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END, match, limit],
+        )
+        return cursor.fetchall()
+
+
+class PostgresBackend:
+    def create(self, cursor):
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS courses_search ("
+            "id bigint PRIMARY KEY, kind varchar(10) NOT NULL, object_id bigint NOT NULL, "
+            "course_id bigint NOT NULL, title text NOT NULL, body text NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+            ") STORED)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS courses_search_document_idx ON courses_search USING GIN (document)"
+        )
+
+    def drop(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS courses_search")
+
+    def upsert(self, cursor, rows):
+        cursor.executemany(
+            "INSERT INTO courses_search (id, kind, object_id, course_id, title, body) "
+            "VALUES (%s, %s, %s, %s, %s, %s) "
+            "ON CONFLICT (id) DO UPDATE SET course_id = EXCLUDED.course_id, "
+            "title = EXCLUDED.title, body = EXCLUDED.body",
+            rows,
+        )
+
+    def delete(self, cursor, row_ids):
+        cursor.execute("DELETE FROM courses_search WHERE id = ANY(%s)", [list(row_ids)])
+
+    def clear(self, cursor):
+        cursor.execute("TRUNCATE courses_search")
+
+    def search(self, cursor, query, limit):
+        options = f'StartSel={MARK_START}, StopSel={MARK_END}'
+        # ts_headline is expensive, so it only runs on the ranked top rows.
+        cursor.execute(
+            "SELECT kind, object_id, course_id, "
+            "ts_headline('simple', title, query, %s), "
+            "ts_headline('simple', body, query, %s), rank "
+            "FROM ("
+            "  SELECT s.*, q.query, ts_rank_cd(s.document, q.query) AS rank "
+            "  FROM courses_search s, websearch_to_tsquery('simple', %s) AS q(query) "
+            "  WHERE s.document @@ q.query ORDER BY rank DESC LIMIT %s"
+            ") hits ORDER BY rank DESC",
+            [options + ', HighlightAll=true', options + ', MaxFragments=2, MaxWords=20, MinWords=5', query, limit],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def get_backend(conn=connection):
+    return BACKENDS.get(conn.vendor)
+
+
+def _upsert(rows):
+    backend = get_backend()
+    if backend is not None and rows:
+        with connection.cursor() as cursor:
+            backend.upsert(cursor, rows)
+
+
+def index_courses(courses):
+    _upsert([
+        (_row_id(COURSE, course.pk), COURSE, course.pk, course.pk, course.title, strip_tags(course.description))
+        for course in courses
+    ])
+
+
+def index_lessons(lessons):
+    """``lessons`` are ``(lesson, course_id)`` pairs."""
+    _upsert([
+        (_row_id(LESSON, lesson.pk), LESSON, lesson.pk, course_id, lesson.title, strip_tags(lesson.content))
+        for lesson, course_id in lessons
+    ])
+
+
+def unindex(kind, object_ids):
+    backend = get_backend()
+    if backend is not None and object_ids:
+        with connection.cursor() as cursor:
+            backend.delete(cursor, [_row_id(kind, object_id) for object_id in object_ids])
+
+
+def clear_index():
+    backend = get_backend()
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.clear(cursor)
+
+
+def search(query, limit=20):
+    backend = get_backend()
+    if backend is None:
+        return []
+    with connection.cursor() as cursor:
+        rows = backend.search(cursor, query, limit)
+    return [
+        {'type': kind, 'id': object_id, 'course': course_id, 'title': title, 'snippet': snippet, 'rank': rank}
+        for kind, object_id, course_id, title, snippet, rank in rows
+    ]
@@ -1,30 +1,143 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Course, Chapter, Lesson, Enrollment
+from apps.common.serializers import SparseFieldsetMixin
+from . import analytics
+from .models import Course, Chapter, Lesson, Enrollment, EnrollmentRollup, LessonProgress, RelatedCourse
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Lesson
         fields = '__all__'
 
-class ChapterSerializer(serializers.ModelSerializer):
+class ChapterSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
 
     class Meta:
         model = Chapter
         fields = '__all__'
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     chapters = ChapterSerializer(many=True, read_only=True)
     created_by = serializers.ReadOnlyField(source='created_by.username')
 
     class Meta:
         model = Course
         fields = '__all__'
+        read_only_fields = Course.COUNTER_FIELDS
+
+class CourseListSerializer(serializers.ModelSerializer):
+    created_by = serializers.ReadOnlyField(source='created_by.username')
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'level', 'created_by', 'created_at', 'chapters_count', 'lessons_count',
+                  'enrollments_count']
+        read_only_fields = Course.COUNTER_FIELDS
+
+class CatalogueLessonSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'order', 'is_free_preview']
+
+class CatalogueChapterSerializer(serializers.ModelSerializer):
+    lessons = CatalogueLessonSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Chapter
+        fields = ['id', 'title', 'order', 'lessons']
+
+class CatalogueCourseSerializer(serializers.ModelSerializer):
+    """Public outline: lesson titles only, content is reserved for enrolled users and free previews."""
+    chapters = CatalogueChapterSerializer(many=True, read_only=True)
+    created_by = serializers.ReadOnlyField(source='created_by.username')
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'level', 'created_by', 'created_at', 'updated_at',
+                  'chapters_count', 'lessons_count', 'chapters']
+
+class RelatedCourseSerializer(serializers.ModelSerializer):
+    course = CourseListSerializer(source='related', read_only=True)
+
+    class Meta:
+        model = RelatedCourse
+        fields = ['course', 'score']
 
 class EnrollmentSerializer(serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
+    total_lessons = serializers.ReadOnlyField(source='course.lessons_count')
+    progress_percent = serializers.ReadOnlyField()
 
     class Meta:
         model = Enrollment
-        fields = ['id', 'course', 'enrolled_at']
+        fields = ['id', 'course', 'enrolled_at', 'completed_lessons', 'total_lessons', 'progress_percent']
+        read_only_fields = ['completed_lessons']
+
+class EnrollmentSummarySerializer(EnrollmentSerializer):
+    course = CourseListSerializer(read_only=True)
+
+class ReorderSerializer(serializers.Serializer):
+    order = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+class MoveSerializer(serializers.Serializer):
+    after = serializers.IntegerField(allow_null=True)
+
+class LessonImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['title', 'content', 'video_url', 'order', 'is_free_preview']
+
+class ChapterImportSerializer(serializers.ModelSerializer):
+    lessons = LessonImportSerializer(many=True, required=False)
+
+    class Meta:
+        model = Chapter
+        fields = ['title', 'order', 'lessons']
+
+class CourseImportSerializer(serializers.ModelSerializer):
+    chapters = ChapterImportSerializer(many=True, required=False)
+
+    class Meta:
+        model = Course
+        fields = ['title', 'description', 'level', 'chapters']
+
+class BulkEnrollSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    courses = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    file = serializers.FileField(required=False, help_text="CSV with a user_id column and an optional course_id column")
+
+    def validate(self, attrs):
+        if not attrs['users'] and 'file' not in attrs:
+            raise serializers.ValidationError("Provide 'users' or a CSV 'file'.")
+        return attrs
+
+class ProgressEventSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField(min_value=1, max_value=LessonProgress.MAX_ID)
+    position = serializers.IntegerField(min_value=0, max_value=LessonProgress.MAX_POSITION, default=0)
+    completed = serializers.BooleanField(default=False)
+
+class LessonProgressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonProgress
+        fields = ['lesson', 'position', 'completed', 'completed_at', 'updated_at']
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    MAX_BUCKETS = 366
+
+    period = serializers.ChoiceField(choices=EnrollmentRollup.PERIODS, default=EnrollmentRollup.DAY)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
 
+    def validate(self, attrs):
+        """Fills in the default range: up to today, the last 30 days or 12 weeks."""
+        period = attrs['period']
+        step = timedelta(days=1 if period == EnrollmentRollup.DAY else 7)
+        end = attrs.setdefault('end', timezone.localdate(timezone=analytics.local_zone()))
+        start = attrs.setdefault('start', end - step * (analytics.DEFAULT_BUCKETS[period] - 1))
+        if start > end:
+            raise serializers.ValidationError("'start' must not be after 'end'.")
+        if (end - start) // step >= self.MAX_BUCKETS:
+            raise serializers.ValidationError(f"At most {self.MAX_BUCKETS} buckets per request.")
+        return attrs
@@ -0,0 +1,170 @@
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import instructors, search, similarity
+from .cache import bump_catalogue_version, bump_course_version
+from .enrollments import enrollments_changed, forget_memberships
+from .models import Course, Chapter, Lesson, Enrollment, LessonProgress
+
+
+def lesson_course_id(lesson):
+    if Lesson.chapter.is_cached(lesson):
+        return lesson.chapter.course_id
+    return Chapter.objects.filter(pk=lesson.chapter_id).values_list('course_id', flat=True).first()
+
+
+def _delta(kwargs):
+    """+1 for a newly created row, -1 for a deleted one, 0 for an update."""
+    if kwargs['signal'] is post_delete:
+        return -1
+    return 1 if kwargs.get('created') else 0
+
+
+def _course_cascade(kwargs):
+    """
+    True when a row is deleted because its course is (``origin`` is the
+    Course or a Course queryset): the counters, rollups, stats and progress
+    kept for that course go with it, so per-row bookkeeping is skipped.
+    """
+    origin = kwargs.get('origin')
+    if isinstance(origin, QuerySet):
+        return origin.model is Course
+    return isinstance(origin, Course)
+
+
+def _moved_from(instance, previous_course_id):
+    """The course ``instance`` was just moved away from by this save, or None."""
+    previous = getattr(instance, '_previous_course_id', None)
+    instance._previous_course_id = None
+    if previous is not None and previous != previous_course_id:
+        return previous
+    return None
+
+
+def _text_changed(instance, current, kwargs):
+    """Whether this save changed the text ``instance`` adds to its course's similarity document."""
+    previous = instance.__dict__.pop('_previous_text', current)
+    return kwargs.get('created') or previous != current
+
+
+@receiver(pre_save, sender=Course)
+def course_saving(sender, instance, update_fields=None, **kwargs):
+    if not instance._state.adding and (update_fields is None or {'title', 'description'} & set(update_fields)):
+        instance._previous_text = (
+            Course.objects.filter(pk=instance.pk).values_list('title', 'description').first()
+        )
+
+
+@receiver(pre_save, sender=Chapter)
+def chapter_saving(sender, instance, **kwargs):
+    # The parent FK is writable, so remember where an existing chapter is moving from.
+    if not instance._state.adding:
+        instance._previous_course_id = (
+            Chapter.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+        )
+
+
+@receiver(pre_save, sender=Lesson)
+def lesson_saving(sender, instance, **kwargs):
+    if not instance._state.adding:
+        previous = Lesson.objects.filter(pk=instance.pk).values_list('chapter__course_id', 'title').first()
+        instance._previous_course_id, instance._previous_text = previous or (None, None)
+
+
+@receiver(pre_delete, sender=Course)
+def course_deleting(sender, instance, **kwargs):
+    # Unindexed in one go after the delete, instead of lesson by lesson.
+    instance._lesson_ids = list(Lesson.objects.filter(chapter__course=instance).values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_course_version(instance.pk)
+    bump_catalogue_version()
+    if _delta(kwargs):
+        instructors.forget_stats([instance.created_by_id])
+    if kwargs['signal'] is post_save:
+        search.index_courses([instance])
+        if _text_changed(instance, (instance.title, instance.description), kwargs):
+            similarity.schedule_update(instance.pk)
+    else:
+        search.unindex(search.COURSE, [instance.pk])
+        search.unindex(search.LESSON, getattr(instance, '_lesson_ids', []))
+        similarity.bump_version()
+
+
+def _moved(course_ids, lessons):
+    """Follow-up for ``lessons`` that moved between ``course_ids`` (old, new)."""
+    instructors.forget_stats(course_ids=course_ids)
+    completed_by = LessonProgress.objects.filter(lesson__in=lessons, completed=True).values('user_id')
+    Enrollment.objects.filter(course_id__in=course_ids, user_id__in=completed_by).rebuild_progress()
+    for course_id in course_ids:
+        bump_course_version(course_id)
+        similarity.schedule_update(course_id)
+
+
+@receiver([post_save, post_delete], sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    if _course_cascade(kwargs):
+        return
+    delta = _delta(kwargs)
+    if delta:
+        Course.objects.filter(pk=instance.course_id).adjust_counters(chapters_count=delta)
+        instructors.forget_stats(course_ids=[instance.course_id])
+    bump_course_version(instance.course_id)
+    previous_course_id = _moved_from(instance, instance.course_id)
+    if previous_course_id is not None:
+        # The chapter's lessons move with it.
+        lessons = list(instance.lessons.all())
+        Course.objects.filter(pk=previous_course_id).adjust_counters(chapters_count=-1, lessons_count=-len(lessons))
+        Course.objects.filter(pk=instance.course_id).adjust_counters(chapters_count=1, lessons_count=len(lessons))
+        search.index_lessons([(lesson, instance.course_id) for lesson in lessons])
+        _moved([previous_course_id, instance.course_id], lessons)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    if _course_cascade(kwargs):
+        return
+    if kwargs['signal'] is post_delete:
+        search.unindex(search.LESSON, [instance.pk])
+    course_id = lesson_course_id(instance)
+    if course_id is not None:
+        delta = _delta(kwargs)
+        if delta:
+            Course.objects.filter(pk=course_id).adjust_counters(lessons_count=delta)
+            instructors.forget_stats(course_ids=[course_id])
+        bump_course_version(course_id)
+        if kwargs['signal'] is post_delete or _text_changed(instance, instance.title, kwargs):
+            similarity.schedule_update(course_id)
+        if kwargs['signal'] is post_save:
+            search.index_lessons([(instance, course_id)])
+        previous_course_id = _moved_from(instance, course_id)
+        if previous_course_id is not None:
+            Course.objects.filter(pk=previous_course_id).adjust_counters(lessons_count=-1)
+            Course.objects.filter(pk=course_id).adjust_counters(lessons_count=1)
+            _moved([previous_course_id, course_id], [instance])
+
+
+@receiver(pre_delete, sender=Lesson)
+def lesson_deleting(sender, instance, **kwargs):
+    if _course_cascade(kwargs):
+        return
+    # Progress rows go with the lesson (CASCADE), so take their completions off first.
+    course_id = lesson_course_id(instance)
+    completed_by = LessonProgress.objects.filter(lesson=instance, completed=True).values('user_id')
+    Enrollment.objects.filter(course_id=course_id, user_id__in=completed_by, completed_lessons__gt=0).update(
+        completed_lessons=F('completed_lessons') - 1
+    )
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    if _course_cascade(kwargs):
+        forget_memberships([instance.user_id])
+        return
+    if kwargs.get('created'):
+        # Lessons completed before enrolling (free previews) count too.
+        Enrollment.objects.filter(pk=instance.pk).rebuild_progress()
+    enrollments_changed({instance.course_id: _delta(kwargs)}, [instance.user_id], enrolled_at=instance.enrolled_at)
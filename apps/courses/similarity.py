@@ -0,0 +1,177 @@
+"""
+Content-based "similar courses" from TF-IDF vectors.
+
+Each course (title, description and lesson titles) is stored as a hashed
+term-frequency vector in CourseVector: sorted term ids (int32) and sublinear
+tf weights (float32), a few hundred bytes per course. IDF is not stored; it is
+computed from the loaded matrix, so editing one course only rewrites that
+course's row and every other vector stays valid.
+
+``similar`` loads all vectors into one L2-normalized sparse TF-IDF matrix
+and scores a course against the whole catalogue with a single sparse
+matrix-vector product. The matrix is cached per process; when the index
+version changes, only the vectors written since the last load are read back
+and patched into the term-frequency matrix, and deleted courses are dropped.
+
+Course saves that don't change the title or description and lesson saves
+that don't change the title leave the vector alone; updates scheduled in one
+transaction are merged into a single ``update`` after commit.
+"""
+import re
+import threading
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .cache import bump_stamp, version_stamp
+from .models import Course, CourseVector, Lesson
+
+DIMENSIONS = 2 ** 18
+VERSION_KEY = 'similarity:version'
+# Vectors written this long before a load are read again by the next refresh,
+# in case their transaction committed after the load had started.
+REFRESH_OVERLAP = timedelta(minutes=5)
+TOKEN = re.compile(r'\w\w+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from how in into is it of on or the to with your you va bilan uchun'.split()
+)
+CHUNK_SIZE = 2000
+
+_loaded = None  # (version, loaded at, course ids, term frequencies, row of each course id, matrix)
+_pending = threading.local()
+
+
+def vectorize(texts):
+    """Hashed sublinear term frequencies of ``texts`` as (term ids, weights)."""
+    tokens = [
+        token for text in texts if text for token in TOKEN.findall(text.lower()) if token not in STOP_WORDS
+    ]
+    terms = np.fromiter(
+        (zlib.crc32(token.encode()) % DIMENSIONS for token in tokens), dtype=np.int32, count=len(tokens)
+    )
+    terms, counts = np.unique(terms, return_counts=True)
+    return terms.astype(np.int32), (1 + np.log(counts)).astype(np.float32)
+
+
+def _documents(course_ids):
+    lesson_titles = defaultdict(list)
+    lessons = Lesson.objects.filter(chapter__course_id__in=course_ids).values_list('chapter__course_id', 'title')
+    for course_id, title in lessons:
+        lesson_titles[course_id].append(title)
+    for course_id, title, description in Course.objects.filter(pk__in=course_ids).values_list(
+        'pk', 'title', 'description'
+    ):
+        # The title is counted twice: it says more about a course than any one lesson.
+        yield course_id, [title, title, description, *lesson_titles[course_id]]
+
+
+def bump_version():
+    bump_stamp(VERSION_KEY)
+
+
+def update(course_ids):
+    """(Re)compute the vectors of ``course_ids``; courses that no longer exist are skipped."""
+    vectors = []
+    for course_id, texts in _documents(course_ids):
+        terms, weights = vectorize(texts)
+        vectors.append(CourseVector(course_id=course_id, terms=terms.tobytes(), weights=weights.tobytes()))
+    CourseVector.objects.bulk_create(
+        vectors, batch_size=500, update_conflicts=True, unique_fields=['course'],
+        update_fields=['terms', 'weights', 'updated_at'],
+    )
+    bump_version()
+
+
+def _scheduled():
+    if not hasattr(_pending, 'course_ids'):
+        _pending.course_ids = set()
+    return _pending.course_ids
+
+
+def schedule_update(course_id):
+    """Refresh one course's vector once the current transaction has committed."""
+    _scheduled().add(course_id)
+    # As with surrogate purges, the first callback after commit updates every
+    # course scheduled so far and the rest find nothing left to do.
+    transaction.on_commit(flush_scheduled)
+
+
+def flush_scheduled():
+    scheduled = _scheduled()
+    course_ids = sorted(scheduled)
+    scheduled.clear()
+    if course_ids:
+        update(course_ids)
+
+
+def _term_frequencies(rows):
+    ids, indptr, indices, data = [], [0], [], []
+    for course_id, terms, weights in rows:
+        ids.append(course_id)
+        indices.append(np.frombuffer(terms, dtype=np.int32))
+        data.append(np.frombuffer(weights, dtype=np.float32))
+        indptr.append(indptr[-1] + len(indices[-1]))
+    if not ids:
+        return np.empty(0, dtype=np.int64), sparse.csr_matrix((0, DIMENSIONS), dtype=np.float32)
+    tf = sparse.csr_matrix(
+        (np.concatenate(data), np.concatenate(indices), np.array(indptr)), shape=(len(ids), DIMENSIONS)
+    )
+    return np.array(ids, dtype=np.int64), tf
+
+
+def _weigh(tf):
+    """The L2-normalized TF-IDF matrix of the term frequencies ``tf``."""
+    document_frequency = np.bincount(tf.indices, minlength=DIMENSIONS)
+    idf = (np.log((1 + tf.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+    matrix = tf.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ matrix).tocsr()
+
+
+def _vectors():
+    return CourseVector.objects.order_by('pk').values_list('course_id', 'terms', 'weights')
+
+
+def _load():
+    return _term_frequencies(_vectors().iterator(chunk_size=CHUNK_SIZE))
+
+
+def _refresh(ids, tf, since):
+    """``ids``/``tf`` with the vectors written after ``since`` re-read and deleted courses dropped."""
+    changed_ids, changed = _term_frequencies(_vectors().filter(updated_at__gte=since - REFRESH_OVERLAP))
+    existing = np.fromiter(CourseVector.objects.values_list('course_id', flat=True), dtype=np.int64)
+    keep = np.isin(ids, existing) & ~np.isin(ids, changed_ids)
+    return np.concatenate([ids[keep], changed_ids]), sparse.vstack([tf[keep], changed], format='csr')
+
+
+def _index():
+    global _loaded
+    version = version_stamp(VERSION_KEY)
+    if _loaded is None or _loaded[0] != version:
+        loaded_at = timezone.now()
+        ids, tf = _load() if _loaded is None else _refresh(*_loaded[2:4], since=_loaded[1])
+        rows = {int(course_id): row for row, course_id in enumerate(ids)}
+        _loaded = (version, loaded_at, ids, tf, rows, _weigh(tf))
+    return _loaded[2], _loaded[4], _loaded[5]
+
+
+def similar(course_id, limit=10):
+    """[(course id, cosine similarity)] of the ``limit`` most similar courses, best first."""
+    ids, rows, matrix = _index()
+    row = rows.get(course_id)
+    if row is None or limit < 1:
+        return []
+    scores = (matrix @ matrix[row].T).toarray().ravel()
+    scores[row] = 0
+    limit = min(limit, len(ids) - 1)
+    if limit < 1:
+        return []
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.lexsort((ids[top], -scores[top]))]
+    return [(int(ids[index]), round(float(scores[index]), 4)) for index in top if scores[index] > 0]
@@ -1,3 +1,1216 @@
-from django.test import TestCase
+import io
+import json
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+import numpy as np
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.common.mixins import QueryBudgetExceeded
+from apps.common import surrogate
+from apps.common.readers import ValuesReader
+from apps.common.serializers import Fieldset
+from apps.common.renderers import MessagePackRenderer, ORJSONRenderer
+from apps.common.testing import QueryPlanMixin
+from apps.users.models import User
+from .cache import outline_cache_stats
+from . import enrollments, progress, recommendations, similarity
+from .serializers import (
+    ChapterSerializer, CourseListSerializer, CourseSerializer, EnrollmentSerializer, LessonSerializer
+)
+from .models import (
+    Course, CourseVector, Chapter, Lesson, Enrollment, EnrollmentRollup, LessonProgress, RelatedCourse
+)
+from .views import CourseViewSet
+
+
+def make_course(user, title='Django', chapters=2, lessons=3):
+    course = Course.objects.create(title=title, description='About ' + title, level='beginner', created_by=user)
+    for c in range(chapters):
+        chapter = Chapter.objects.create(course=course, title=f'Chapter {c}', order=c)
+        for n in range(lessons):
+            Lesson.objects.create(chapter=chapter, title=f'Lesson {c}.{n}', content='Text', order=n)
+    return course
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class CoursesTestCase(APITestCase):
+    """
+    Tests start logged in as ``self.user``, the author of ``self.course``.
+    Subclasses change only what differs: ``user_options`` are extra
+    ``create_user`` arguments, ``course_shape`` the ``make_course`` arguments
+    of ``self.course`` (None: no course).
+    """
+    user_options = {}
+    course_shape = {}
+
+    def setUp(self):
+        # Cached versions, outlines and memberships would otherwise leak between tests.
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='author@example.com', username='author', password='secret', **self.user_options
+        )
+        self.client.force_authenticate(self.user)
+        self.course = None if self.course_shape is None else make_course(self.user, **self.course_shape)
+
+
+class QueryBudgetTests(CoursesTestCase):
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        self.courses = [make_course(self.user, title=f'Course {i}') for i in range(5)]
+        for course in self.courses:
+            Enrollment.objects.create(user=self.user, course=course)
+
+    def test_course_endpoints_stay_within_budget(self):
+        self.assertEqual(self.client.get('/api/courses/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/courses/{self.courses[0].pk}/').status_code, 200)
+
+    def test_chapter_and_lesson_endpoints_stay_within_budget(self):
+        self.assertEqual(self.client.get('/api/chapters/').status_code, 200)
+        self.assertEqual(self.client.get('/api/lessons/').status_code, 200)
+
+    def test_enrollment_endpoints_stay_within_budget(self):
+        self.assertEqual(self.client.get('/api/enrollments/').status_code, 200)
+        self.assertEqual(self.client.get('/api/enrollments/my_courses/').status_code, 200)
+
+    def test_exceeding_the_budget_fails(self):
+        with mock.patch.object(CourseViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/courses/')
+
+
+class CourseListTests(CoursesTestCase):
+    def test_list_is_a_summary(self):
+        item = self.client.get('/api/courses/').data['results'][0]
+        self.assertEqual(item['created_by'], 'author')
+        self.assertEqual(item['chapters_count'], 2)
+        self.assertEqual(item['lessons_count'], 6)
+        self.assertNotIn('description', item)
+        self.assertNotIn('chapters', item)
+
+    def test_detail_keeps_the_full_tree(self):
+        data = self.client.get(f'/api/courses/{self.course.pk}/').data
+        self.assertEqual(data['description'], 'About Django')
+        self.assertEqual(len(data['chapters'][0]['lessons']), 3)
+
+
+class CourseOutlineCacheTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 1}
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/courses/{self.course.pk}/'
+
+    def test_second_read_only_reads_the_enrollment_counter(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            data = self.client.get(self.url).data
+        self.assertEqual(data['enrollments_count'], 0)
+        self.assertEqual(outline_cache_stats()['hits'], 1)
+        self.assertEqual(outline_cache_stats()['misses'], 1)
+
+    def test_lesson_edit_invalidates_the_outline(self):
+        self.client.get(self.url)
+        lesson = Lesson.objects.get()
+        lesson.title = 'Renamed'
+        lesson.save()
+        data = self.client.get(self.url).data
+        self.assertEqual(data['chapters'][0]['lessons'][0]['title'], 'Renamed')
+
+    def test_moves_invalidate_both_courses(self):
+        other = make_course(self.user, title='Flask', chapters=1, lessons=1)
+        other_url = f'/api/courses/{other.pk}/'
+        self.client.get(self.url)
+        self.client.get(other_url)
+        lesson = Lesson.objects.get(chapter__course=other)
+        lesson.chapter = self.course.chapters.get()
+        lesson.save()
+        self.assertEqual(self.client.get(other_url).data['chapters'][0]['lessons'], [])
+        self.assertEqual(len(self.client.get(self.url).data['chapters'][0]['lessons']), 2)
+
+        response = self.client.patch(f'/api/chapters/{self.course.chapters.get().pk}/', {'course': other.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).data['chapters'], [])
+        self.assertEqual(len(self.client.get(other_url).data['chapters']), 2)
+
+    def test_missing_course_is_404(self):
+        self.assertEqual(self.client.get('/api/courses/999/').status_code, 404)
+
+
+class ConditionalGetTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 1}
+
+    def test_course_not_modified_without_queries(self):
+        url = f'/api/courses/{self.course.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Lesson.objects.update(title='Changed')
+        Lesson.objects.get().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_enrolling_keeps_the_etag(self):
+        url = f'/api/courses/{self.course.pk}/'
+        etag = self.client.get(url)['ETag']
+        student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.client.force_authenticate(student)
+        self.client.post(f'/api/enrollments/{self.course.pk}/enroll/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url).data['enrollments_count'], 1)
+
+    def test_non_numeric_ids_are_not_found(self):
+        for url in ('/api/chapters/abc/', '/api/lessons/abc/'):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_chapter_and_lesson_validators(self):
+        for url in (f'/api/chapters/{Chapter.objects.get().pk}/', f'/api/lessons/{Lesson.objects.get().pk}/'):
+            response = self.client.get(url)
+            self.assertIn('Last-Modified', response)
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(again.status_code, 304)
+
+
+class PaginationTests(CoursesTestCase):
+    course_shape = {'chapters': 3, 'lessons': 0}
+
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            make_course(self.user, title=f'Extra {i}', chapters=0, lessons=0)
+
+    def test_course_cursor_pages_cover_everything_once(self):
+        seen, url = [], '/api/courses/?page_size=2'
+        while url:
+            data = self.client.get(url).data
+            self.assertNotIn('count', data)
+            seen += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(sorted(seen), sorted(Course.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_offset_pagination_without_count(self):
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/chapters/?limit=2&count=false').data
+        self.assertNotIn('count', data)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        self.assertIsNone(self.client.get(data['next']).data['next'])
+
+
+class SearchTests(CoursesTestCase):
+    course_shape = {'title': 'Python basics', 'chapters': 1, 'lessons': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.lesson = Lesson.objects.create(
+            chapter=self.course.chapters.get(), title='Generators', content='<p>Lazy iteration with yield</p>'
+        )
+
+    def test_lessons_and_courses_are_ranked_with_snippets(self):
+        results = self.client.get('/api/courses/search/?q=yield').data['results']
+        self.assertEqual([(r['type'], r['id']) for r in results], [('lesson', self.lesson.pk)])
+        self.assertIn('<mark>yield</mark>', results[0]['snippet'])
+        results = self.client.get('/api/courses/search/?q=pyth').data['results']
+        self.assertEqual(results[0]['type'], 'course')
+        self.assertIn('<mark>Python</mark>', results[0]['title'])
+
+    def test_locked_lessons_are_not_found(self):
+        student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.client.force_authenticate(student)
+        self.assertEqual(self.client.get('/api/courses/search/?q=yield').data['results'], [])
+        Lesson.objects.filter(pk=self.lesson.pk).update(is_free_preview=True)
+        result, = self.client.get('/api/courses/search/?q=yield').data['results']
+        self.assertIn('<mark>yield</mark>', result['snippet'])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.lesson.content = 'Coroutines'
+        self.lesson.save()
+        self.assertEqual(self.client.get('/api/courses/search/?q=yield').data['results'], [])
+        self.course.delete()
+        self.assertEqual(self.client.get('/api/courses/search/?q=coroutines').data['results'], [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        response = self.client.get('/api/courses/search/', {'q': 'NEAR( "python* OR'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ReorderTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.chapter = self.course.chapters.get()
+        self.lessons = [
+            self.client.post('/api/lessons/', {'chapter': self.chapter.pk, 'title': f'L{i}'}).data['id']
+            for i in range(5)
+        ]
+
+    def lesson_ids(self):
+        return list(Lesson.objects.filter(chapter=self.chapter).order_by('order').values_list('id', flat=True))
+
+    def test_new_lessons_are_appended_with_gaps(self):
+        self.assertEqual(list(Lesson.objects.order_by('id').values_list('order', flat=True)),
+                         [1024, 2048, 3072, 4096, 5120])
+
+    def test_moving_one_lesson_writes_one_row(self):
+        response = self.client.post(f'/api/lessons/{self.lessons[4]}/move/', {'after': self.lessons[0]})
+        self.assertEqual(response.data, {'updated': 1})
+        ids = self.lessons
+        self.assertEqual(self.lesson_ids(), [ids[0], ids[4], ids[1], ids[2], ids[3]])
+
+    def test_bulk_reorder(self):
+        new_order = list(reversed(self.lessons))
+        response = self.client.post('/api/lessons/reorder/', {'order': new_order}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lesson_ids(), new_order)
+
+    def test_reordering_invalidates_the_outline(self):
+        url = f'/api/courses/{self.course.pk}/'
+        self.client.get(url)
+        self.client.post(f'/api/lessons/{self.lessons[4]}/move/', {'after': None}, format='json')
+        lessons = self.client.get(url).data['chapters'][0]['lessons']
+        self.assertEqual(lessons[0]['id'], self.lessons[4])
+        second = Chapter.objects.create(course=self.course, title='Second', order=0)
+        self.client.get(url)
+        self.client.post('/api/chapters/reorder/', {'order': [self.chapter.pk, second.pk]}, format='json')
+        self.assertEqual(self.client.get(url).data['chapters'][1]['id'], second.pk)
+
+    def test_reorder_rejects_partial_lists(self):
+        response = self.client.post('/api/lessons/reorder/', {'order': self.lessons[:2]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_renumbers_when_gaps_run_out(self):
+        Lesson.objects.update(order=0)
+        self.client.post('/api/lessons/reorder/', {'order': self.lessons}, format='json')
+        self.assertEqual(self.lesson_ids(), self.lessons)
+
+
+class ImportTests(CoursesTestCase):
+    course_shape = None
+
+    def test_ndjson_import_reports_bad_rows_and_keeps_good_ones(self):
+        good = {'title': 'Go', 'description': 'Gophers', 'level': 'beginner', 'chapters': [
+            {'title': 'Intro', 'lessons': [{'title': 'Hello'}, {'title': 'World', 'is_free_preview': True}]},
+        ]}
+        body = '\n'.join([
+            json.dumps(good),
+            '{not json',
+            json.dumps({'title': 'No level', 'description': ''}),
+            '',
+            json.dumps(dict(good, title='Rust')),
+        ])
+        response = self.client.generic('POST', '/api/courses/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Lesson.objects.filter(chapter__course__title='Rust').count(), 2)
+        self.assertEqual(list(Lesson.objects.order_by('id').values_list('order', flat=True))[:2], [1024, 2048])
+        self.assertEqual(self.client.get('/api/courses/search/?q=gophers').data['results'][0]['type'], 'course')
+
+
+class ExportTests(CoursesTestCase):
+    user_options = {'is_staff': True}
+    course_shape = {'chapters': 2, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        make_course(self.user, title='Empty', chapters=0)
+        Enrollment.objects.create(user=self.user, course=self.course)
+
+    def read(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_course_ndjson_and_csv(self):
+        lines = self.read(self.client.get('/api/courses/export/')).splitlines()
+        documents = [json.loads(line) for line in lines]
+        self.assertEqual(len(documents), 2)
+        self.assertEqual(len(documents[0]['chapters'][1]['lessons']), 2)
+        rows = self.read(self.client.get('/api/courses/export/?output=csv')).splitlines()
+        self.assertEqual(len(rows), 1 + 4 + 1)
+
+    def test_enrollment_export(self):
+        rows = self.read(self.client.get('/api/enrollments/export/?output=csv')).splitlines()
+        self.assertEqual(rows[1].split(',')[2], 'author')
+        document = json.loads(self.read(self.client.get('/api/enrollments/export/')))
+        self.assertEqual(document['course'], self.course.pk)
+
+    def test_export_is_staff_only(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/enrollments/export/').status_code, 403)
+
+
+class CounterTests(CoursesTestCase):
+    course_shape = {'chapters': 2, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.other = make_course(self.user, title='Other', chapters=0)
+
+    def counters(self, course):
+        course.refresh_from_db()
+        return course.chapters_count, course.lessons_count, course.enrollments_count
+
+    def test_counters_follow_writes(self):
+        self.client.post(f'/api/enrollments/{self.course.pk}/enroll/')
+        self.assertEqual(self.counters(self.course), (2, 4, 1))
+        Chapter.objects.filter(course=self.course).first().delete()
+        self.assertEqual(self.counters(self.course), (1, 2, 1))
+
+    def test_moves_carry_their_counters(self):
+        chapter = self.course.chapters.first()
+        response = self.client.patch(f'/api/chapters/{chapter.pk}/', {'course': self.other.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counters(self.course)[:2], (1, 2))
+        self.assertEqual(self.counters(self.other)[:2], (1, 2))
+        lesson = Lesson.objects.filter(chapter__course=self.course).first()
+        self.client.patch(f'/api/lessons/{lesson.pk}/', {'chapter': chapter.pk})
+        self.assertEqual(self.counters(self.course)[:2], (1, 1))
+        self.assertEqual(self.counters(self.other)[:2], (1, 3))
+        self.assertEqual(self.client.delete(f'/api/chapters/{chapter.pk}/').status_code, 204)
+        self.assertEqual(self.counters(self.other)[:2], (0, 0))
+
+    def test_drifted_counters_never_go_negative(self):
+        Course.objects.filter(pk=self.course.pk).update(chapters_count=0, lessons_count=0)
+        self.assertEqual(self.client.delete(f'/api/chapters/{self.course.chapters.first().pk}/').status_code, 204)
+        self.assertEqual(self.counters(self.course)[:2], (0, 0))
+
+    def test_course_delete_skips_per_row_bookkeeping(self):
+        for index in range(20):
+            student = User.objects.create_user(email=f's{index}@example.com', username=f's{index}')
+            Enrollment.objects.create(user=student, course=self.course)
+        with CaptureQueriesContext(connection) as context:
+            self.course.delete()
+        self.assertLess(len(context), 25)
+        self.assertFalse(Lesson.objects.exists())
+        self.assertEqual(self.client.get('/api/courses/search/?q=lesson').data['results'], [])
+        self.assertEqual(self.counters(self.other), (0, 0, 0))
+
+    def test_edit_does_not_overwrite_counters(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        Enrollment.objects.create(user=self.user, course=self.course)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.counters(self.course), (2, 4, 1))
+
+    def test_reconcile_and_popular(self):
+        Course.objects.update(lessons_count=0, enrollments_count=0)
+        call_command('reconcile_course_counters', stdout=io.StringIO())
+        self.assertEqual(self.counters(self.course), (2, 4, 0))
+        Enrollment.objects.create(user=self.user, course=self.other)
+        results = self.client.get('/api/courses/popular/').data['results']
+        self.assertEqual([course['id'] for course in results], [self.other.pk, self.course.pk])
+
+
+class EnrollTests(CoursesTestCase):
+    user_options = {'is_staff': True}
+    course_shape = {'chapters': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(email=f'u{i}@example.com', username=f'u{i}', password='secret') for i in range(3)
+        ]
+
+    def test_single_enroll(self):
+        url = f'/api/enrollments/{self.course.pk}/enroll/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post('/api/enrollments/999/enroll/').status_code, 404)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 1)
+
+    def test_bulk_enroll_json(self):
+        Enrollment.objects.create(user=self.users[0], course=self.course)
+        response = self.client.post('/api/enrollments/bulk/', {
+            'users': [user.pk for user in self.users] + [999], 'courses': [self.course.pk],
+        }, format='json')
+        self.assertEqual(response.data, {'created': 2, 'skipped': 1, 'unknown_users': [999], 'unknown_courses': []})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrollments_count, 3)
+
+    def test_bulk_enroll_csv(self):
+        upload = io.BytesIO(('user_id\n' + '\n'.join(str(user.pk) for user in self.users)).encode())
+        upload.name = 'cohort.csv'
+        response = self.client.post('/api/enrollments/bulk/', {'file': upload, 'courses': [self.course.pk]})
+        self.assertEqual(response.data['created'], 3)
+
+    def test_bulk_enroll_csv_short_row(self):
+        upload = io.BytesIO(f'course_id,user_id\n{self.course.pk},{self.users[0].pk}\n{self.course.pk}\n'.encode())
+        upload.name = 'cohort.csv'
+        response = self.client.post('/api/enrollments/bulk/', {'file': upload, 'courses': [self.course.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 3', response.data['file'][0])
+
+    def test_bulk_enroll_is_staff_only(self):
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/api/enrollments/bulk/', {'users': [1], 'courses': [1]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class MyCoursesTests(CoursesTestCase):
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Enrollment.objects.create(user=self.user, course=make_course(self.user, title=f'C{i}'))
+
+    def test_my_courses_is_a_paginated_summary(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/enrollments/my_courses/?page_size=2').data
+        self.assertEqual(len(data['results']), 2)
+        course = data['results'][0]['course']
+        self.assertEqual((course['title'], course['lessons_count'], course['created_by']), ('C2', 6, 'author'))
+        self.assertNotIn('chapters', course)
+        self.assertEqual(len(self.client.get(data['next']).data['results']), 1)
+
+
+class LessonAccessTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.client.force_authenticate(self.student)
+        self.preview, self.paid = Lesson.objects.order_by('order')
+        self.preview.is_free_preview = True
+        self.preview.save()
+
+    def test_free_preview_needs_no_enrollment(self):
+        self.assertEqual(self.client.get(f'/api/lessons/{self.preview.pk}/').status_code, 200)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.paid.pk}/').status_code, 403)
+        ids = [lesson['id'] for lesson in self.client.get('/api/lessons/').data['results']]
+        self.assertEqual(ids, [self.preview.pk])
+
+    def test_enrollment_unlocks_lessons_and_is_cached(self):
+        self.client.get(f'/api/lessons/{self.paid.pk}/')
+        self.client.post(f'/api/enrollments/{self.course.pk}/enroll/')
+        self.assertEqual(self.client.get(f'/api/lessons/{self.paid.pk}/').status_code, 200)
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/lessons/{self.paid.pk}/')
+
+    def test_author_can_read_own_lessons(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(f'/api/lessons/{self.paid.pk}/').status_code, 200)
+
+    def test_outlines_hide_locked_content(self):
+        chapter = self.course.chapters.get()
+
+        def contents():
+            course = self.client.get(f'/api/courses/{self.course.pk}/').data
+            sparse = self.client.get('/api/courses/?fields=title,chapters.lessons.content').data['results']
+            return [
+                [lesson['content'] for lesson in course['chapters'][0]['lessons']],
+                [lesson['content'] for lesson in self.client.get(f'/api/chapters/{chapter.pk}/').data['lessons']],
+                [lesson['content'] for lesson in self.client.get('/api/chapters/').data['results'][0]['lessons']],
+                sparse,
+            ]
+
+        locked = contents()
+        self.assertEqual(locked[:3], [['Text', None]] * 3)
+        self.assertEqual(locked[3], [{'title': 'Django', 'chapters': [{'lessons': [{'content': 'Text'}, {'content': None}]}]}])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(contents()[:3], [['Text', 'Text']] * 3)
+        self.client.force_authenticate(self.student)
+        etag = self.client.get(f'/api/courses/{self.course.pk}/')['ETag']
+        self.client.post(f'/api/enrollments/{self.course.pk}/enroll/')
+        self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(contents()[:3], [['Text', 'Text']] * 3)
+
+
+@override_settings(LESSON_PROGRESS_FLUSH_BATCH=5)
+class LessonProgressTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.first, self.second = Lesson.objects.order_by('order')
+
+    def post(self, events):
+        return self.client.post('/api/progress/', events, format='json')
+
+    def test_heartbeats_are_buffered_and_coalesced(self):
+        with self.assertNumQueries(0):
+            response = self.post([{'lesson': self.first.pk, 'position': 10}, {'lesson': self.first.pk, 'position': 20}])
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(LessonProgress.objects.exists())
+        self.post({'lesson': self.first.pk, 'position': 15})
+        self.post([{'lesson': self.second.pk, 'completed': True}, {'lesson': 999}])  # fifth event flushes
+        rows = {row.lesson_id: row for row in LessonProgress.objects.all()}
+        self.assertEqual(rows[self.first.pk].position, 20)
+        self.assertTrue(rows[self.second.pk].completed)
+        self.assertEqual(progress.pending(), 0)
+
+    def test_flush_command_updates_existing_rows(self):
+        self.post({'lesson': self.first.pk, 'position': 30})
+        call_command('flush_lesson_progress', stdout=io.StringIO())
+        self.post({'lesson': self.first.pk, 'position': 40, 'completed': True})
+        call_command('flush_lesson_progress', stdout=io.StringIO())
+        row = LessonProgress.objects.get()
+        self.assertEqual((row.position, row.completed), (40, True))
+        self.assertEqual(self.client.get('/api/progress/').data['results'][0]['position'], 40)
+
+    def test_missing_event_stalls_once_then_is_skipped(self):
+        self.post([{'lesson': self.first.pk, 'position': 5}, {'lesson': self.second.pk, 'position': 7}])
+        cache.delete('progress:event:1')
+        self.assertEqual(progress.flush(), 0)
+        self.assertEqual(progress.flush(), 2)
+        self.assertEqual(LessonProgress.objects.get().lesson_id, self.second.pk)
+
+    def test_progress_needs_access_to_the_lesson(self):
+        self.second.is_free_preview = True
+        self.second.save()
+        student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.client.force_authenticate(student)
+        self.post([{'lesson': self.first.pk, 'completed': True}, {'lesson': self.second.pk, 'position': 5}])
+        progress.flush()
+        self.assertEqual(list(LessonProgress.objects.values_list('lesson_id', flat=True)), [self.second.pk])
+
+        Enrollment.objects.create(user=student, course=self.first.chapter.course)
+        self.post({'lesson': self.first.pk, 'completed': True})
+        progress.flush()
+        self.assertTrue(LessonProgress.objects.get(user=student, lesson=self.first).completed)
+
+    def test_event_lists_are_bounded(self):
+        response = self.post([{'lesson': self.first.pk}] * 101)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(progress.pending(), 0)
+
+    def test_out_of_range_events_do_not_block_the_buffer(self):
+        self.assertEqual(self.post({'lesson': self.first.pk, 'position': 10 ** 20}).status_code, 400)
+        self.assertEqual(self.post({'lesson': 10 ** 20}).status_code, 400)
+        progress.record(self.user.pk, [{'lesson': 10 ** 20, 'position': 10 ** 20, 'completed': False}])
+        self.post({'lesson': self.first.pk, 'position': 5})
+        self.assertEqual(progress.flush(), 2)
+        self.assertEqual(LessonProgress.objects.get().position, 5)
+
+
+class EnrollmentCompletionTests(CoursesTestCase):
+    course_shape = {'chapters': 2, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.lessons = list(Lesson.objects.order_by('chapter__order', 'order'))
+        self.enrollment = Enrollment.objects.create(user=self.student, course=self.course)
+        self.client.force_authenticate(self.student)
+
+    def summary(self):
+        return self.client.get('/api/enrollments/my_courses/').data['results'][0]
+
+    def test_completions_are_counted_on_the_enrollment(self):
+        self.assertEqual(self.client.post(f'/api/lessons/{self.lessons[0].pk}/complete/').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/lessons/{self.lessons[0].pk}/complete/').status_code, 200)
+        self.client.post('/api/progress/', [{'lesson': self.lessons[1].pk, 'completed': True}], format='json')
+        progress.flush()
+        data = self.summary()
+        self.assertEqual((data['completed_lessons'], data['total_lessons'], data['progress_percent']), (2, 4, 50.0))
+
+    def test_deleting_a_completed_lesson_takes_it_off(self):
+        progress.complete(self.student.pk, self.lessons[0].pk)
+        self.lessons[0].delete()
+        data = self.summary()
+        self.assertEqual((data['completed_lessons'], data['total_lessons']), (0, 3))
+
+    def test_moving_a_completed_lesson_moves_the_completion(self):
+        other = make_course(self.user, title='Other', chapters=1, lessons=0)
+        Enrollment.objects.create(user=self.student, course=other)
+        progress.complete(self.student.pk, self.lessons[0].pk)
+        self.lessons[0].chapter = other.chapters.get()
+        self.lessons[0].save()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_lessons, 0)
+        self.assertEqual(Enrollment.objects.get(course=other).completed_lessons, 1)
+
+    def test_earlier_completions_count_when_enrolling(self):
+        other = make_course(self.user, title='Other', chapters=1, lessons=2)
+        lesson = other.chapters.get().lessons.first()
+        lesson.is_free_preview = True
+        lesson.save()
+        self.assertEqual(self.client.post(f'/api/lessons/{lesson.pk}/complete/').status_code, 201)
+        self.client.post(f'/api/enrollments/{other.pk}/enroll/')
+        self.assertEqual(Enrollment.objects.get(course=other).completed_lessons, 1)
+
+    def test_earlier_completions_of_locked_lessons_do_not_count(self):
+        other = make_course(self.user, title='Other', chapters=1, lessons=1)
+        LessonProgress.objects.create(
+            user=self.student, lesson=other.chapters.get().lessons.get(), completed=True, completed_at=timezone.now()
+        )
+        self.client.post(f'/api/enrollments/{other.pk}/enroll/')
+        self.assertEqual(Enrollment.objects.get(course=other).completed_lessons, 0)
+        call_command('rebuild_enrollment_progress', stdout=io.StringIO())
+        self.assertEqual(Enrollment.objects.get(course=other).completed_lessons, 0)
+
+    def test_complete_requires_access(self):
+        outsider = User.objects.create_user(email='outsider@example.com', username='outsider', password='secret')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.post(f'/api/lessons/{self.lessons[0].pk}/complete/').status_code, 403)
+
+    def test_rebuild_command(self):
+        progress.complete(self.student.pk, self.lessons[0].pk)
+        Enrollment.objects.update(completed_lessons=3)
+        call_command('rebuild_enrollment_progress', stdout=io.StringIO())
+        self.assertEqual(Enrollment.objects.get().completed_lessons, 1)
+
+
+class RelatedCoursesTests(CoursesTestCase):
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        self.python, self.django, self.react, self.sql = [
+            make_course(self.user, title=title, chapters=0) for title in ('Python', 'Django', 'React', 'SQL')
+        ]
+        students = [
+            User.objects.create_user(email=f's{n}@example.com', username=f's{n}', password='secret') for n in range(4)
+        ]
+        # Django: 3 shared students with Python, React: 1, SQL: 1
+        for student, courses in zip(students, [
+            [self.python, self.django], [self.python, self.django, self.sql],
+            [self.python, self.django, self.react], [self.react],
+        ]):
+            for course in courses:
+                Enrollment.objects.create(user=student, course=course)
+
+    def related(self, course):
+        return [(row['course']['title'], row['score']) for row in self.client.get(f'/api/courses/{course.pk}/related/').data['results']]
+
+    def test_build_ranks_by_shared_students(self):
+        call_command('build_related_courses', stdout=io.StringIO())
+        self.assertEqual(self.related(self.python), [('Django', 3), ('React', 1), ('SQL', 1)])
+        self.assertEqual(self.related(self.react), [('Python', 1), ('Django', 1)])
+
+    def test_top_k_and_single_query(self):
+        recommendations.build(top_k=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.related(self.python), [('Django', 3)])
+
+    def test_incremental_build_only_touches_affected_courses(self):
+        recommendations.build()
+        untouched = set(RelatedCourse.objects.filter(course=self.python).values_list('pk', flat=True))
+        student = User.objects.create_user(email='new@example.com', username='new', password='secret')
+        since = timezone.now()
+        Enrollment.objects.create(user=student, course=self.sql)
+        Enrollment.objects.create(user=student, course=self.react)
+        self.assertEqual(recommendations.build(since=since), 2)
+        self.assertEqual(self.related(self.sql), [('Python', 1), ('Django', 1), ('React', 1)])
+        self.assertEqual(set(RelatedCourse.objects.filter(course=self.python).values_list('pk', flat=True)), untouched)
+
+    def test_missing_course_is_404(self):
+        self.assertEqual(self.client.get('/api/courses/999/related/').status_code, 404)
+        self.assertEqual(self.related(self.python), [])
+
+
+class SimilarCoursesTests(CoursesTestCase):
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.django = self.create('Django REST APIs', 'Build web APIs with Django and Python')
+            self.flask = self.create('Flask web apps', 'Small web apps in Python')
+            self.cooking = self.create('Italian cooking', 'Pasta, pizza and risotto at home')
+
+    def create(self, title, description):
+        return Course.objects.create(title=title, description=description, level='beginner', created_by=self.user)
+
+    def similar(self, course):
+        response = self.client.get(f'/api/courses/{course.pk}/similar/')
+        return [row['course']['title'] for row in response.data['results']]
+
+    def test_similar_by_text(self):
+        self.assertEqual(self.similar(self.django), ['Flask web apps'])
+        self.assertEqual(self.similar(self.cooking), [])
+
+    def test_edits_update_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cooking.description = 'Cooking a Python web app backend'
+            self.cooking.save()
+        self.assertEqual(self.similar(self.cooking), ['Flask web apps', 'Django REST APIs'])
+        chapter = Chapter.objects.create(course=self.flask, title='Basics')
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(chapter=chapter, title='Pizza and pasta')
+        terms, _ = similarity.vectorize(['pizza'])
+        self.assertIn(terms[0], np.frombuffer(CourseVector.objects.get(course=self.flask).terms, dtype=np.int32))
+
+    def test_only_document_edits_update_vectors_once_per_commit(self):
+        chapter = Chapter.objects.create(course=self.flask, title='Basics')
+        with mock.patch.object(similarity, 'update', wraps=similarity.update) as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                lessons = [Lesson.objects.create(chapter=chapter, title=f'Part {n}') for n in range(3)]
+            update.assert_called_once_with([self.flask.pk])
+            update.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                lessons[0].content = 'New text'
+                lessons[0].save()
+                self.flask.level = 'advanced'
+                self.flask.save()
+            update.assert_not_called()
+
+    def test_refresh_reads_only_changed_vectors(self):
+        self.similar(self.django)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cooking.description = 'Cooking a Python web app backend'
+            self.cooking.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.similar(self.cooking), ['Flask web apps', 'Django REST APIs'])
+        read = [q['sql'] for q in queries if 'weights' in q['sql']]
+        self.assertEqual(len(read), 1)
+        self.assertIn('updated_at', read[0])
+        self.cooking.delete()
+        self.assertEqual(self.similar(self.django), ['Flask web apps'])
+
+    def test_vectors_are_float32(self):
+        vector = CourseVector.objects.get(course=self.django)
+        terms = np.frombuffer(vector.terms, dtype=np.int32)
+        self.assertEqual(len(bytes(vector.weights)), 4 * len(terms))
+        self.assertTrue(np.all(np.diff(terms) > 0))
+
+    def test_rebuild_command_and_missing_course(self):
+        CourseVector.objects.all().delete()
+        call_command('rebuild_similarity_index', stdout=io.StringIO())
+        self.assertEqual(CourseVector.objects.count(), 3)
+        self.assertEqual(self.similar(self.django), ['Flask web apps'])
+        self.assertEqual(self.client.get('/api/courses/999/similar/').status_code, 404)
+
+
+class EnrollmentAnalyticsTests(CoursesTestCase):
+    # 20:30 UTC on Sunday is 01:30 on Monday 2 March in Tashkent.
+    LATE_SUNDAY_UTC = datetime(2026, 3, 1, 20, 30, tzinfo=dt_timezone.utc)
+    course_shape = {'chapters': 0}
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        self.client.force_authenticate(self.student)
+        with mock.patch('django.utils.timezone.now', return_value=self.LATE_SUNDAY_UTC):
+            self.client.post(f'/api/enrollments/{self.course.pk}/enroll/')
+            enrollments.bulk_enroll([(self.user.pk, self.course.pk)])
+
+    def rollups(self):
+        return sorted(EnrollmentRollup.objects.filter(count__gt=0).values_list('period', 'bucket', 'count'))
+
+    def test_buckets_use_local_dates(self):
+        self.assertEqual(self.rollups(), [('day', date(2026, 3, 2), 2), ('week', date(2026, 3, 2), 2)])
+
+    def test_backfill_matches_incremental_rollups(self):
+        incremental = self.rollups()
+        EnrollmentRollup.objects.all().delete()
+        call_command('backfill_enrollment_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_unenrolling_decrements(self):
+        Enrollment.objects.get(user=self.student).delete()
+        self.assertEqual(self.rollups(), [('day', date(2026, 3, 2), 1), ('week', date(2026, 3, 2), 1)])
+
+    def test_endpoint_serves_zero_filled_series(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/courses/{self.course.pk}/analytics/'
+        data = self.client.get(url, {'start': '2026-03-01', 'end': '2026-03-03'}).data
+        self.assertEqual(data['timezone'], 'Asia/Tashkent')
+        self.assertEqual([point['enrollments'] for point in data['results']], [0, 2, 0])
+        weeks = self.client.get(url, {'period': 'week', 'start': '2026-02-24', 'end': '2026-03-08'}).data['results']
+        self.assertEqual([(point['bucket'], point['enrollments']) for point in weeks], [(date(2026, 2, 23), 0), (date(2026, 3, 2), 2)])
+        self.assertEqual(len(self.client.get(url).data['results']), 30)
+        self.assertEqual(self.client.get(url, {'start': '2026-03-03', 'end': '2026-03-01'}).status_code, 400)
+
+    def test_defaults_are_validated_too(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/courses/{self.course.pk}/analytics/'
+        self.assertEqual(self.client.get(url, {'start': '0001-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '9999-01-01'}).status_code, 400)
+        today = timezone.localdate()
+        data = self.client.get(url, {'start': str(today - timedelta(days=2))}).data
+        self.assertEqual(len(data['results']), 3)
+
+    def test_only_author_sees_analytics(self):
+        self.assertEqual(self.client.get(f'/api/courses/{self.course.pk}/analytics/').status_code, 403)
+
+
+class InstructorStatsTests(CoursesTestCase):
+    user_options = {'auth_role': 'seller'}
+    course_shape = {'chapters': 2, 'lessons': 3}
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user(email='student@example.com', username='student', password='secret')
+        make_course(self.user, title='Flask', chapters=1, lessons=1)
+        make_course(self.student, title='Not mine')
+        Enrollment.objects.create(user=self.student, course=self.course)
+
+    def stats(self):
+        return self.client.get('/api/instructor/stats/').data
+
+    def test_totals_in_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            data = self.stats()
+        self.assertEqual(
+            {key: data[key] for key in ('courses', 'chapters', 'lessons', 'enrollments', 'recent_enrollments')},
+            {'courses': 2, 'chapters': 3, 'lessons': 7, 'enrollments': 1, 'recent_enrollments': 1},
+        )
+        with self.assertNumQueries(0):
+            self.stats()
+
+    def test_counter_changes_invalidate(self):
+        self.stats()
+        Enrollment.objects.create(user=self.user, course=self.course)
+        self.assertEqual(self.stats()['enrollments'], 2)
+        Lesson.objects.filter(chapter__course=self.course).first().delete()
+        self.assertEqual(self.stats()['lessons'], 6)
+        self.course.delete()
+        self.assertEqual(self.stats()['courses'], 1)
+
+    def test_buyers_are_refused(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/instructor/stats/').status_code, 403)
+
+
+class QueryPlanTests(QueryPlanMixin, CoursesTestCase):
+    large_tables = {
+        'courses_course', 'courses_chapter', 'courses_lesson', 'courses_enrollment', 'courses_lessonprogress',
+        'courses_enrollmentrollup', 'courses_relatedcourse',
+    }
+
+    user_options = {'auth_role': 'seller'}
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        students = [
+            User.objects.create_user(email=f's{n}@example.com', username=f's{n}', password='secret') for n in range(3)
+        ]
+        self.courses = [make_course(self.user, title=f'Course {n}', chapters=2, lessons=2) for n in range(3)]
+        for student in students:
+            for course in self.courses[:2]:
+                Enrollment.objects.create(user=student, course=course)
+        self.student = students[0]
+        self.lesson = Lesson.objects.filter(chapter__course=self.courses[0]).first()
+        progress.complete(self.student.pk, self.lesson.pk)
+        recommendations.build()
+
+    def test_viewset_queries_use_indexes(self):
+        course, chapter = self.courses[0], self.courses[0].chapters.first()
+        with self.assertNoSeqScans():
+            for url in [
+                '/api/courses/', '/api/courses/?level=beginner', f'/api/courses/?created_by={self.user.pk}',
+                f'/api/courses/{course.pk}/',
+                '/api/courses/popular/', f'/api/courses/{course.pk}/related/', f'/api/courses/{course.pk}/analytics/',
+                '/api/chapters/', f'/api/chapters/?course={course.pk}', f'/api/chapters/{chapter.pk}/',
+                f'/api/lessons/{self.lesson.pk}/', '/api/enrollments/', f'/api/enrollments/?course={course.pk}',
+                '/api/instructor/stats/',
+            ]:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.client.force_authenticate(self.student)
+        with self.assertNoSeqScans():
+            for url in [
+                '/api/lessons/', f'/api/lessons/?chapter={chapter.pk}', '/api/enrollments/my_courses/', '/api/progress/',
+            ]:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class AdminChangelistTests(CoursesTestCase):
+    user_options = {'is_staff': True, 'is_superuser': True}
+    course_shape = None
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def add_rows(self, n):
+        for index in range(n):
+            student = User.objects.create_user(
+                email=f'{self._testMethodName}{User.objects.count()}@example.com', username=f'u{User.objects.count()}',
+            )
+            course = make_course(student, title=f'Course {index}', chapters=1, lessons=2)
+            Enrollment.objects.create(user=student, course=course)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def test_changelists_run_constant_queries(self):
+        urls = [
+            '/admin/courses/course/', '/admin/courses/chapter/', '/admin/courses/lesson/',
+            '/admin/courses/enrollment/', '/admin/courses/enrollment/?q=u', '/admin/users/user/',
+        ]
+        self.add_rows(2)
+        before = [self.queries(url) for url in urls]
+        self.add_rows(5)
+        self.assertEqual([self.queries(url) for url in urls], before)
+
+    def test_changelists_join_only_what_they_show(self):
+        self.add_rows(1)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/admin/courses/lesson/')
+        rows_query = next(query['sql'] for query in context.captured_queries if 'courses_lesson"."title' in query['sql'])
+        self.assertIn('courses_course', rows_query)
+        self.assertNotIn('users_user', rows_query)
+
+    def test_foreign_key_widgets_do_not_load_every_row(self):
+        self.add_rows(3)
+        response = self.client.get('/admin/courses/enrollment/add/')
+        self.assertNotContains(response, 'Course 2</option>')
+        response = self.client.get('/admin/courses/chapter/add/')
+        self.assertContains(response, 'admin-autocomplete')
+
+
+class RendererNegotiationTests(CoursesTestCase):
+    renderers = [ORJSONRenderer, MessagePackRenderer]
+
+    def test_msgpack_on_request_json_by_default(self):
+        url = f'/api/courses/{self.course.pk}/'
+        with mock.patch.object(CourseViewSet, 'renderer_classes', self.renderers):
+            default = self.client.get(url)
+            packed = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(default['Content-Type'], 'application/json')
+        self.assertEqual(packed['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(packed.content), json.loads(default.content))
+        self.assertEqual(json.loads(default.content), json.loads(self.client.get(url).content))
+
+    def test_representations_have_their_own_etags(self):
+        url = f'/api/courses/{self.course.pk}/'
+        with mock.patch.object(CourseViewSet, 'renderer_classes', self.renderers):
+            default = self.client.get(url)
+            packed = self.client.get(url, HTTP_ACCEPT='application/msgpack', HTTP_IF_NONE_MATCH=default['ETag'])
+        self.assertEqual(packed.status_code, 200)
+        self.assertNotEqual(packed['ETag'], default['ETag'])
+        self.assertIn('Accept', packed['Vary'])
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_renderers', lessons=30, repeat=1, stdout=out)
+        self.assertIn('msgpack', out.getvalue())
+        self.assertFalse(Course.objects.filter(title='Benchmark').exists())
+
+
+class ValuesReaderTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        Lesson.objects.filter(pk=Lesson.objects.filter(chapter__course=self.course).first().pk).update(
+            video_url='https://videos.example.com/1', is_free_preview=True
+        )
+        Chapter.objects.create(course=self.course, title='Empty', order=5)
+        make_course(self.user, title='Flask', chapters=0)
+
+    def assertSameAsSerializer(self, serializer_class, queryset):
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(ValuesReader.for_serializer(serializer_class).read(queryset), expected)
+
+    def test_output_matches_the_serializers(self):
+        self.assertSameAsSerializer(LessonSerializer, Lesson.objects.all())
+        self.assertSameAsSerializer(ChapterSerializer, Chapter.objects.with_lessons())
+        self.assertSameAsSerializer(CourseSerializer, Course.objects.with_outline().order_by('pk'))
+        self.assertSameAsSerializer(CourseListSerializer, Course.objects.for_listing().order_by('pk'))
+
+    def test_endpoints_match_the_serializers(self):
+        self.assertEqual(
+            self.client.get('/api/courses/').data['results'],
+            CourseListSerializer(Course.objects.for_listing().order_by('-created_at', '-id'), many=True).data,
+        )
+        self.assertEqual(
+            self.client.get(f'/api/courses/{self.course.pk}/').data,
+            CourseSerializer(Course.objects.with_outline().get(pk=self.course.pk)).data,
+        )
+        chapter = self.course.chapters.first()
+        self.assertEqual(
+            self.client.get(f'/api/chapters/{chapter.pk}/').data,
+            ChapterSerializer(Chapter.objects.with_lessons().get(pk=chapter.pk)).data,
+        )
+        self.assertEqual(self.client.get('/api/chapters/999999/').status_code, 404)
+
+    def test_unsupported_fields_are_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesReader.for_serializer(EnrollmentSerializer)
+
+    def test_benchmark_command(self):
+        out = io.StringIO()
+        call_command('benchmark_readers', lessons=30, repeat=1, stdout=out)
+        self.assertIn('chapters', out.getvalue())
+        self.assertFalse(Course.objects.filter(title='Benchmark').exists())
+
+
+class SparseFieldsetTests(CoursesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/courses/{self.course.pk}/'
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data, context.captured_queries
+
+    def test_fields_narrow_the_select(self):
+        results, queries = self.get('/api/courses/?fields=id,title,level')
+        self.assertEqual(results['results'], [{'id': self.course.pk, 'title': 'Django', 'level': 'beginner'}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('description', queries[0]['sql'])
+        self.assertNotIn('users_user', queries[0]['sql'])
+
+    def test_unrequested_nesting_costs_no_queries(self):
+        data, queries = self.get(self.url + '?fields=id,title')
+        self.assertEqual(data, {'id': self.course.pk, 'title': 'Django'})
+        self.assertFalse(any('courses_chapter' in query['sql'] for query in queries))
+
+    def test_expansion_matches_the_narrowed_serializer(self):
+        fieldset = Fieldset.parse('title,chapters.title,chapters.lessons.id', 'chapters.lessons')
+        expected = CourseSerializer(Course.objects.with_outline().get(pk=self.course.pk), fieldset=fieldset).data
+        data, queries = self.get(self.url + '?fields=title,chapters.title,chapters.lessons.id&expand=chapters.lessons')
+        self.assertEqual(data, expected)
+        self.assertEqual([len(chapter['lessons']) for chapter in data['chapters']], [3, 3])
+        self.assertEqual(set(data['chapters'][0]), {'title', 'lessons'})
+        results, _ = self.get('/api/courses/?expand=chapters')
+        self.assertNotIn('lessons', results['results'][0]['chapters'][0])
+        chapter = self.course.chapters.first()
+        data, _ = self.get(f'/api/chapters/{chapter.pk}/?fields=id,lessons.title')
+        self.assertEqual(data, {'id': chapter.pk, 'lessons': [{'title': f'Lesson 0.{n}'} for n in range(3)]})
+
+    def test_default_output_is_unchanged(self):
+        data, _ = self.get(self.url)
+        self.assertEqual(data, CourseSerializer(Course.objects.with_outline().get(pk=self.course.pk)).data)
+        results, _ = self.get('/api/courses/')
+        self.assertNotIn('chapters', results['results'][0])
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/courses/?fields=nope').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?fields=chapters.nope').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?expand=title').status_code, 400)
+
+    def test_writes_ignore_the_fieldset(self):
+        response = self.client.patch(self.url + '?fields=id', {'title': 'Django 5'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Django 5')
+
+
+class CatalogueTests(CoursesTestCase):
+    course_shape = {'chapters': 1, 'lessons': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.lesson, self.locked = Lesson.objects.filter(chapter__course=self.course)
+        Lesson.objects.filter(pk=self.lesson.pk).update(is_free_preview=True)
+        self.url = f'/api/catalogue/courses/{self.course.pk}/'
+
+    def get(self, url, **extra):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **extra)
+        return response, len(context)
+
+    def test_anonymous_pages_are_publicly_cacheable(self):
+        for url, key in [
+            ('/api/catalogue/courses/', 'course-list'),
+            (self.url, f'course-{self.course.pk}'),
+            (f'{self.url}lessons/{self.lesson.pk}/', f'course-{self.course.pk}'),
+        ]:
+            # An invalid token is never looked at.
+            response, _ = self.get(url, HTTP_AUTHORIZATION='Bearer not-a-token')
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('s-maxage=600', response['Cache-Control'])
+            self.assertEqual(response['Surrogate-Key'], key)
+        self.assertEqual(self.client.post('/api/catalogue/courses/', {}).status_code, 405)
+
+    def test_outline_hides_lesson_content_and_locked_lessons(self):
+        response, _ = self.get(self.url)
+        lessons = response.data['chapters'][0]['lessons']
+        self.assertEqual([lesson['is_free_preview'] for lesson in lessons], [True, False])
+        self.assertNotIn('content', lessons[0])
+        response, _ = self.get(f'{self.url}lessons/{self.lesson.pk}/')
+        self.assertEqual(response.data['content'], 'Text')
+        response, _ = self.get(f'{self.url}lessons/{self.locked.pk}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('Surrogate-Key', response)
+
+    def test_repeat_requests_are_served_from_the_cache(self):
+        for url in ['/api/catalogue/courses/', self.url, f'{self.url}lessons/{self.lesson.pk}/']:
+            self.get(url)
+            response, queries = self.get(url)
+            self.assertEqual((response.status_code, queries), (200, 0), url)
+        _, queries = self.get('/api/catalogue/courses/?utm_source=mail')
+        self.assertEqual(queries, 0)
+
+    def test_page_size_and_filters_are_part_of_the_cache_key(self):
+        make_course(self.user, title='Flask', chapters=0)
+        response, _ = self.get('/api/catalogue/courses/?page_size=1')
+        self.assertEqual(len(response.data['results']), 1)
+        response, _ = self.get('/api/catalogue/courses/')
+        self.assertEqual(len(response.data['results']), 2)
+        response, _ = self.get('/api/catalogue/courses/?level=advanced')
+        self.assertEqual(response.data['results'], [])
+
+    def test_unknown_ids_leave_nothing_in_the_cache(self):
+        for url in ['/api/catalogue/courses/99999/', '/api/catalogue/courses/99999/lessons/1/']:
+            response, _ = self.get(url)
+            self.assertEqual(response.status_code, 404)
+        self.assertIsNone(cache.get('course:99999:version'))
+
+    @override_settings(SURROGATE_PURGE_URL='https://cdn.example.com/purge', SURROGATE_PURGE_TOKEN='token')
+    def test_edits_purge_by_course_id(self):
+        self.get(self.url)
+        self.get('/api/catalogue/courses/')
+        with mock.patch.object(surrogate, 'urlopen') as urlopen:
+            with self.captureOnCommitCallbacks(execute=True):
+                for title in ['One', 'Two']:
+                    self.locked.title = title
+                    self.locked.save()
+            surrogate.wait()
+        self.assertEqual(urlopen.call_count, 1)
+        request = urlopen.call_args.args[0]
+        self.assertIn(f'course-{self.course.pk}', request.get_header('Surrogate-key').split())
+        self.assertEqual(request.get_header('Fastly-key'), 'token')
+        response, _ = self.get(self.url)
+        self.assertEqual(response.data['chapters'][0]['lessons'][1]['title'], 'Two')
+
+        with mock.patch.object(surrogate, 'urlopen') as urlopen:
+            with self.captureOnCommitCallbacks(execute=True):
+                make_course(self.user, title='Flask', chapters=0)
+            surrogate.wait()
+        self.assertIn('course-list', urlopen.call_args.args[0].get_header('Surrogate-key').split())
+        response, _ = self.get('/api/catalogue/courses/')
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_failed_purge_does_not_fail_the_write(self):
+        with override_settings(SURROGATE_PURGE_URL='https://cdn.example.com/purge'):
+            with mock.patch.object(surrogate, 'urlopen', side_effect=OSError('down')):
+                with self.assertLogs('apps.common.surrogate'):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        self.course.title = 'Django 5'
+                        self.course.save()
+                    surrogate.wait()
+
+    @override_settings(SURROGATE_PURGE_URL='https://cdn.example.com/purge')
+    def test_purges_are_sent_off_the_request_thread(self):
+        sent = threading.Event()
+        threads = []
+
+        def urlopen(request, timeout):
+            threads.append(threading.current_thread())
+            sent.wait(5)
+            return mock.MagicMock()
+
+        with mock.patch.object(surrogate, 'urlopen', side_effect=urlopen):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.course.title = 'Django 5'
+                self.course.save()
+            # The write is done while the purge is still in flight.
+            sent.set()
+            surrogate.wait()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
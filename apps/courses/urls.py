@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourseViewSet, ChapterViewSet, LessonViewSet, EnrollmentViewSet
+from .views import (
+    CourseViewSet, ChapterViewSet, LessonViewSet, EnrollmentViewSet, LessonProgressViewSet,
+    InstructorViewSet, CatalogueViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'chapters', ChapterViewSet, basename='chapter')
 router.register(r'lessons', LessonViewSet, basename='lesson')
 router.register(r'enrollments', EnrollmentViewSet, basename='enrollments')
+router.register(r'progress', LessonProgressViewSet, basename='progress')
+router.register(r'instructor', InstructorViewSet, basename='instructor')
+router.register(r'catalogue/courses', CatalogueViewSet, basename='catalogue-course')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,43 +1,487 @@
-from rest_framework import viewsets, permissions, status
-from .models import Course, Chapter, Lesson, Enrollment
-from .serializers import CourseSerializer, ChapterSerializer, LessonSerializer, EnrollmentSerializer
+import csv
+import io
+
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import mixins, viewsets, permissions, status
+from apps.common.mixins import ConditionalGetMixin, QueryBudgetMixin, SharedCacheMixin, ValuesReadMixin
+from apps.common.pagination import CreatedAtCursorPagination, EnrolledAtCursorPagination
+from apps.common.readers import ValuesReader
+from . import analytics, enrollments, exporter, importer, instructors, ordering, progress, search, similarity
+from .cache import (
+    CATALOGUE_SURROGATE_KEY, bump_course_version, catalogue_version, course_surrogate_key, course_version,
+    existing_course_version, get_course_outline,
+)
+from .filters import ChapterFilter, CourseFilter, EnrollmentFilter, LessonFilter
+from .models import Course, Chapter, Lesson, Enrollment, LessonProgress, RelatedCourse
+from .permissions import IsEnrolledOrFreePreview, IsSellerOrStaff
+from .serializers import (
+    CourseSerializer, CourseListSerializer, ChapterSerializer, LessonSerializer, EnrollmentSerializer,
+    EnrollmentSummarySerializer, ReorderSerializer, MoveSerializer, BulkEnrollSerializer,
+    ProgressEventSerializer, LessonProgressSerializer, RelatedCourseSerializer, AnalyticsQuerySerializer,
+    CatalogueCourseSerializer,
+)
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 
-class CourseViewSet(viewsets.ModelViewSet):
-    queryset = Course.objects.all()
+
+def version_timestamp(version):
+    return version // 10 ** 9
+
+
+class PopularCursorPagination(CreatedAtCursorPagination):
+    ordering = ('-enrollments_count', '-id')
+
+
+class CourseViewSet(ConditionalGetMixin, ValuesReadMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Course.objects.with_outline()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    filterset_class = CourseFilter
+    values_read_actions = ('list',)
+    # retrieve: validators, course, chapters with lessons, and the membership set
+    query_budget = {'list': 1, 'retrieve': 4, 'search': 3, 'popular': 1, 'related': 2, 'similar': 3, 'analytics': 2}
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Course.objects.for_listing()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        # ?fields= / ?expand= pick from the full course instead of the catalogue card
+        if self.action == 'list' and self.get_fieldset() is None:
+            return CourseListSerializer
+        return super().get_serializer_class()
+
+    def get_fieldset(self):
+        fieldset = super().get_fieldset()
+        if fieldset is not None and 'chapters' in dict(fieldset.expand):
+            # restrict() needs the course, its author and each lesson's preview flag.
+            for path in ('id', 'created_by', 'chapters.lessons.is_free_preview'):
+                fieldset = fieldset.including(path)
+        return fieldset
+
+    def get_query_budget(self):
+        budget = super().get_query_budget()
+        fieldset = self.get_fieldset()
+        if budget is not None and self.action == 'list' and fieldset is not None and 'chapters' in dict(fieldset.expand):
+            budget += 1  # the membership set read by restrict()
+        return budget
+
+    def restrict(self, courses):
+        locked = [course for course in courses if IsEnrolledOrFreePreview.has_locked(course.get('chapters', ()))]
+        if not locked:
+            return courses
+        user = self.request.user
+        readable = IsEnrolledOrFreePreview.readable_course_ids(
+            user,
+            [course['id'] for course in locked],
+            authored=[course['id'] for course in locked if course['created_by'] == user.get_username()],
+        )
+        return [
+            course if 'chapters' not in course or course['id'] in readable
+            else {**course, 'chapters': IsEnrolledOrFreePreview.redact_chapters(course['chapters'])}
+            for course in courses
+        ]
+
+    def get_course_id(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+
+    def get_validators(self):
+        course_id = self.get_course_id()
+        version = course_version(course_id)
+        # Locked lesson content is blanked per user, so enrolling has to change the tag too.
+        access = '-enrolled' if enrollments.is_enrolled(self.request.user.pk, course_id) else ''
+        return f'course-{course_id}-{version}{access}', version_timestamp(version)
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.check_conditional_get(request)
+        if not_modified is not None:
+            return not_modified
+        if self.get_fieldset() is not None:
+            data = self.get_object_values()
+        else:
+            data = self.get_outline()
+        return Response(self.present([data])[0])
+
+    def get_outline(self):
+        """
+        The cached outline plus the live enrollments_count, which is kept out
+        of the cache: enrollments don't bump the course version.
+        """
+        course_id = self.get_course_id()
+        counter = {}
+
+        def build():
+            data = self.get_object_values()
+            counter['enrollments_count'] = data.pop('enrollments_count')
+            return data
+
+        data = get_course_outline(course_id, build)
+        if not counter:
+            counter['enrollments_count'] = (
+                Course.objects.filter(pk=course_id).values_list('enrollments_count', flat=True).first()
+            )
+        return {**data, **counter}
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class ChapterViewSet(viewsets.ModelViewSet):
-    queryset = Chapter.objects.all()
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """Courses by enrollment count, served from the (enrollments_count, id) index."""
+        paginator = PopularCursorPagination()
+        reader = ValuesReader.for_serializer(CourseListSerializer)
+        page = paginator.paginate_queryset(reader.values(Course.objects.for_listing()), request, view=self)
+        return paginator.get_paginated_response(reader.shape(page))
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """Students also enrolled in: the precomputed neighbours of this course."""
+        course_id = self.get_course_id()
+        rows = list(RelatedCourse.objects.for_course(course_id))
+        if not rows:
+            get_object_or_404(Course.objects.only('id'), pk=course_id)
+        return Response({'results': RelatedCourseSerializer(rows, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Courses with the most similar text (TF-IDF cosine), for courses without enrollments yet."""
+        course_id = self.get_course_id()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        scores = similarity.similar(course_id, limit=limit)
+        if not scores:
+            get_object_or_404(Course.objects.only('id'), pk=course_id)
+        courses = Course.objects.for_listing().in_bulk([similar_id for similar_id, _ in scores])
+        return Response({'results': [
+            {'course': CourseListSerializer(courses[similar_id]).data, 'score': score}
+            for similar_id, score in scores if similar_id in courses
+        ]})
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """
+        Enrollments per ``period`` (day or week, in Asia/Tashkent dates) from
+        ``start`` to ``end``; by default the last 30 days or 12 weeks.
+        Only the course author and staff can see them.
+        """
+        course = get_object_or_404(Course.objects.only('id', 'created_by_id'), pk=self.get_course_id())
+        if not (request.user.is_staff or course.created_by_id == request.user.pk):
+            self.permission_denied(request, message="Only the course author can see its analytics.")
+        serializer = AnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+        return Response({
+            'course': course.pk,
+            'period': query['period'],
+            'timezone': analytics.local_zone().key,
+            'results': analytics.series(course.pk, query['period'], query['start'], query['end']),
+        })
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_courses(self, request):
+        """Stream an NDJSON body of courses (with nested chapters/lessons) into the catalogue."""
+        lines = request.stream or []
+        report = importer.import_courses(lines, request.user)
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in exporter.FORMATS:
+            return Response({"detail": "output must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+        return exporter.stream('courses', output, exporter.course_documents, exporter.course_rows)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"detail": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 50)
+        except ValueError:
+            limit = 20
+        limit = max(limit, 1)
+        # Lessons the user can't open are dropped: a hit would give away words of their content.
+        # Fetching twice the limit keeps a page full unless most hits are locked.
+        results = search.search(query, limit=2 * limit)
+        lesson_ids = [result['id'] for result in results if result['type'] == search.LESSON]
+        if lesson_ids:
+            readable = IsEnrolledOrFreePreview.readable_ids(request.user, lesson_ids)
+            results = [result for result in results if result['type'] != search.LESSON or result['id'] in readable]
+        return Response({'results': results[:limit]})
+
+class ReorderMixin:
+    """
+    Gap-based ordering for children of a parent (``order_parent_field``):
+    new items are appended after the last sibling, ``reorder`` applies a whole
+    new ordering and ``move`` places one item after another. ``course_lookup``
+    leads from an item to its course id, e.g. ``'chapter__course_id'``.
+    """
+    order_parent_field = None
+    course_lookup = 'course_id'
+
+    def get_siblings(self, obj):
+        model = self.queryset.model
+        parent_id = getattr(obj, f'{self.order_parent_field}_id')
+        return model.objects.filter(**{f'{self.order_parent_field}_id': parent_id})
+
+    def course_id_of(self, obj):
+        if '__' not in self.course_lookup:
+            return getattr(obj, self.course_lookup)
+        model = self.queryset.model
+        return model.objects.filter(pk=obj.pk).values_list(self.course_lookup, flat=True).get()
+
+    def perform_create(self, serializer):
+        if 'order' in serializer.initial_data:
+            return serializer.save()
+        parent = serializer.validated_data[self.order_parent_field]
+        siblings = self.queryset.model.objects.filter(**{self.order_parent_field: parent})
+        serializer.save(order=ordering.next_position(siblings))
+
+    def ordering_changed(self, obj, changed):
+        # bulk_update bypasses post_save, so the cached outline is invalidated here.
+        if changed:
+            bump_course_version(self.course_id_of(obj))
+        return Response({"updated": len(changed)})
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        serializer = ReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['order']
+        first = get_object_or_404(self.queryset.model, pk=ids[0])
+        changed = ordering.reorder(self.get_siblings(first), ids)
+        return self.ordering_changed(first, changed)
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        serializer = MoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        obj = get_object_or_404(self.queryset.model, pk=pk)
+        changed = ordering.move(self.get_siblings(obj), obj, after=serializer.validated_data['after'])
+        return self.ordering_changed(obj, changed)
+
+
+class ChapterViewSet(ReorderMixin, ConditionalGetMixin, ValuesReadMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Chapter.objects.with_lessons()
     serializer_class = ChapterSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # two more than the read itself: the membership set and the authorship check in restrict()
+    query_budget = {'list': 5, 'retrieve': 5}
+    filterset_class = ChapterFilter
+    # get_validators reads the pk before get_object
+    lookup_value_regex = '[0-9]+'
+    values_read_actions = ('list', 'retrieve')
+    order_parent_field = 'course'
 
-class LessonViewSet(viewsets.ModelViewSet):
-    queryset = Lesson.objects.all()
+    def get_fieldset(self):
+        fieldset = super().get_fieldset()
+        if fieldset is not None and 'lessons' in dict(fieldset.expand):
+            fieldset = fieldset.including('course').including('lessons.is_free_preview')
+        return fieldset
+
+    def restrict(self, chapters):
+        course_ids = {chapter['course'] for chapter in chapters if IsEnrolledOrFreePreview.has_locked([chapter])}
+        readable = IsEnrolledOrFreePreview.readable_course_ids(self.request.user, course_ids) if course_ids else ()
+        return [
+            chapter if chapter['course'] not in course_ids or chapter['course'] in readable
+            else IsEnrolledOrFreePreview.redact_chapters([chapter])[0]
+            for chapter in chapters
+        ]
+
+    def get_validators(self):
+        # A chapter embeds its lessons, so it changes whenever its course version does.
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        course_id = Chapter.objects.filter(pk=pk).values_list('course_id', flat=True).first()
+        if course_id is None:
+            return None, None
+        version = course_version(course_id)
+        access = '-enrolled' if enrollments.is_enrolled(self.request.user.pk, course_id) else ''
+        return f'chapter-{pk}-{version}{access}', version_timestamp(version)
+
+class LessonViewSet(ReorderMixin, ConditionalGetMixin, ValuesReadMixin, QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Lesson.objects.select_related('chapter')
     serializer_class = LessonSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, IsEnrolledOrFreePreview]
+    # retrieve: validators, the lesson, the membership set and (not enrolled) the authorship check
+    query_budget = {'list': 3, 'retrieve': 4}
+    filterset_class = LessonFilter
+    # get_validators reads the pk before get_object
+    lookup_value_regex = '[0-9]+'
+    # retrieve keeps the serializer: it needs the object for IsEnrolledOrFreePreview
+    values_read_actions = ('list',)
+    order_parent_field = 'chapter'
+    course_lookup = 'chapter__course_id'
 
-class EnrollmentViewSet(viewsets.ModelViewSet):
-    queryset = Enrollment.objects.all()
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return IsEnrolledOrFreePreview.filter_queryset(queryset, self.request.user)
+        return queryset
+
+    def get_validators(self):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        updated_at = Lesson.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        return f'lesson-{pk}-{updated_at.timestamp()}', updated_at.timestamp()
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Mark the lesson completed now, without waiting for the progress buffer to flush."""
+        lesson = self.get_object()
+        if not IsEnrolledOrFreePreview.can_open(request.user, lesson):
+            self.permission_denied(request, message=IsEnrolledOrFreePreview.message)
+        created = progress.complete(request.user.pk, lesson.pk)
+        return Response({"completed": True}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class EnrollmentViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
+    queryset = Enrollment.objects.with_outline()
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EnrolledAtCursorPagination
+    filterset_class = EnrollmentFilter
+    query_budget = {'list': 3, 'retrieve': 3, 'my_courses': 1}
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in exporter.FORMATS:
+            return Response({"detail": "output must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+        return exporter.stream('enrollments', output, exporter.enrollment_documents, exporter.enrollment_rows)
 
     @action(detail=False, methods=['get'])
     def my_courses(self, request):
-        enrollments = Enrollment.objects.filter(user=request.user)
-        serializer = EnrollmentSerializer(enrollments, many=True)
-        return Response(serializer.data)
+        """The user's enrollments as course cards, newest first; the full tree is on the course detail."""
+        page = self.paginate_queryset(Enrollment.objects.for_summary().filter(user=request.user))
+        serializer = EnrollmentSummarySerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], url_path='enroll')
     def enroll(self, request, pk=None):
-        course = Course.objects.get(pk=pk)
-        enrollment, created = Enrollment.objects.get_or_create(user=request.user, course=course)
+        try:
+            created = enrollments.enroll(request.user, int(pk))
+        except (Course.DoesNotExist, ValueError):
+            raise Http404
         if not created:
             return Response({"detail": "Already enrolled."}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"detail": "Successfully enrolled!"}, status=status.HTTP_201_CREATED)
-    
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[permissions.IsAdminUser],
+            parser_classes=[JSONParser, MultiPartParser])
+    def bulk_enroll(self, request):
+        """
+        Enroll a cohort: JSON ``{"users": [...], "courses": [...]}`` enrolls every
+        user in every course; a CSV ``file`` lists ``user_id`` (and optionally
+        ``course_id``, otherwise ``courses`` applies to every row).
+        """
+        serializer = BulkEnrollSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        pairs = [(user_id, course_id) for user_id in data['users'] for course_id in data['courses']]
+        if 'file' in data:
+            try:
+                rows = csv.DictReader(io.TextIOWrapper(data['file'], encoding='utf-8-sig'))
+                for row in rows:
+                    if not row.get('user_id'):
+                        # DictReader fills the columns missing from a short row with None.
+                        raise ValidationError({'file': [f"Invalid CSV: line {rows.line_num} has no user_id."]})
+                    course_ids = [int(row['course_id'])] if row.get('course_id') else data['courses']
+                    pairs.extend((int(row['user_id']), course_id) for course_id in course_ids)
+            except (KeyError, ValueError, UnicodeDecodeError) as exc:
+                raise ValidationError({'file': [f"Invalid CSV: {exc}"]})
+        return Response(enrollments.bulk_enroll(pairs))
+
+
+class LessonProgressViewSet(QueryBudgetMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    POST takes one progress event or a list of them and only buffers them
+    (202); they reach the database on the next flush. GET lists the user's
+    flushed progress.
+    """
+    serializer_class = LessonProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'list': 2}
+    # a player batches a few minutes of heartbeats at most
+    max_events = 100
+
+    def get_queryset(self):
+        return LessonProgress.objects.filter(user=self.request.user).order_by('-updated_at', '-id')
+
+    def create(self, request):
+        many = isinstance(request.data, list)
+        extra = {'max_length': self.max_events} if many else {}
+        serializer = ProgressEventSerializer(data=request.data, many=many, **extra)
+        serializer.is_valid(raise_exception=True)
+        events = serializer.validated_data if many else [serializer.validated_data]
+        progress.record(request.user.pk, events)
+        return Response({"accepted": len(events)}, status=status.HTTP_202_ACCEPTED)
+
+
+class InstructorViewSet(QueryBudgetMixin, viewsets.ViewSet):
+    permission_classes = [IsSellerOrStaff]
+    query_budget = {'stats': 1}
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Totals over every course the user created; cached and dropped whenever a counter changes."""
+        return Response(instructors.instructor_stats(request.user.pk))
+
+
+class CatalogueViewSet(SharedCacheMixin, ValuesReadMixin, QueryBudgetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Public catalogue for anonymous visitors: course cards, outlines without
+    lesson content, and free preview lessons. Pages are tagged with the
+    course's surrogate key and purged with it whenever its version is bumped.
+    """
+    queryset = Course.objects.all()
+    serializer_class = CatalogueCourseSerializer
+    pagination_class = CreatedAtCursorPagination
+    filterset_fields = ['level']
+    lookup_value_regex = '[0-9]+'
+    values_read_actions = ('list', 'retrieve')
+    # retrieve and preview: plus the existence check before a course's stamp is first created
+    query_budget = {'list': 1, 'retrieve': 4, 'preview': 2}
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Course.objects.for_listing()
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return CourseListSerializer
+        return super().get_serializer_class()
+
+    def get_cache_version(self):
+        if 'pk' in self.kwargs:
+            # None (not cached) for an unknown id: the build then answers 404.
+            return existing_course_version(int(self.kwargs['pk']))
+        return catalogue_version()
+
+    def get_surrogate_keys(self):
+        if 'pk' in self.kwargs:
+            return [course_surrogate_key(int(self.kwargs['pk']))]
+        return [CATALOGUE_SURROGATE_KEY]
+
+    @action(detail=True, methods=['get'], url_path=r'lessons/(?P<lesson_pk>[0-9]+)')
+    def preview(self, request, pk=None, lesson_pk=None):
+        """A free preview lesson of the course, content included."""
+        def build():
+            lessons = Lesson.objects.filter(pk=lesson_pk, chapter__course_id=pk, is_free_preview=True)
+            data = ValuesReader.for_serializer(LessonSerializer).read(lessons)
+            if not data:
+                raise Http404
+            return data[0]
+
+        return Response(self.cached_data(build))
@@ -1,10 +1,13 @@
 from django.contrib import admin
 
+from apps.common.pagination import EstimatedCountPaginator
 from apps.users import models
 
 
 @admin.register(models.User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'auth_type', 'auth_status', 'auth_role')
-
-
+    # Needed by autocomplete_fields on the course admins
+    search_fields = ('username', 'email', 'full_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -73,10 +73,40 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.SearchFilter",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "apps.common.pagination.OptionalCountLimitOffsetPagination",
     "PAGE_SIZE": 10,
 }
 
+# orjson for JSON plus MessagePack (Accept: application/msgpack); see apps/common/renderers.py
+if env.bool("API_FAST_RENDERERS", False):
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = (
+        "apps.common.renderers.ORJSONRenderer",
+        "apps.common.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    )
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] = (
+        "apps.common.renderers.ORJSONParser",
+        "apps.common.renderers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    )
+
+# Fail the request when a viewset exceeds its declared query_budget (turned on in tests)
+QUERY_BUDGET_ENFORCE = env.bool("QUERY_BUDGET_ENFORCE", False)
+
+# Lesson progress write buffer: flush inline once this many events are waiting,
+# and keep buffered events this long (seconds) for `manage.py flush_lesson_progress`
+LESSON_PROGRESS_FLUSH_BATCH = env.int("LESSON_PROGRESS_FLUSH_BATCH", 500)
+LESSON_PROGRESS_BUFFER_TIMEOUT = env.int("LESSON_PROGRESS_BUFFER_TIMEOUT", 60 * 60 * 24)
+
+# Public catalogue (/api/catalogue/): Cache-Control max-age for browsers, s-maxage for
+# shared caches (also how long the server keeps a response), and the CDN's surrogate-key
+# purge endpoint; see apps/common/surrogate.py
+PUBLIC_CACHE_MAX_AGE = env.int("PUBLIC_CACHE_MAX_AGE", 60)
+PUBLIC_CACHE_S_MAXAGE = env.int("PUBLIC_CACHE_S_MAXAGE", 60 * 10)
+SURROGATE_PURGE_URL = env.str("SURROGATE_PURGE_URL", "")
+SURROGATE_PURGE_TOKEN = env.str("SURROGATE_PURGE_TOKEN", "")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),